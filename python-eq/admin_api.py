@@ -0,0 +1,72 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+
+from gateway_client import pool_stats
+from resilience import breaker_states
+from upstream_governor import governor
+from coalescing import coalescer
+from response_cache import response_cache
+from snapshot_store import snapshot_store
+from hierarchy_versions import versions
+
+# ------------------ 🛠️ Admin Routes ------------------
+# Operational endpoints shared by every server in this folder.
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/gateway/pool")
+def gateway_pool():
+    """Connection pool usage per upstream host."""
+    return pool_stats()
+
+
+@router.get("/gateway/governor")
+def gateway_governor():
+    """Upstream admission: calls in flight, queue depth and wait time per priority class."""
+    return governor.stats()
+
+
+@router.get("/coalescing")
+def coalescing_stats():
+    """Hierarchy builds in flight and requests that joined one instead of building."""
+    return coalescer.stats()
+
+
+@router.get("/gateway/breakers")
+def gateway_breakers():
+    """Circuit breaker state per form ID."""
+    return breaker_states()
+
+
+@router.get("/cache")
+def cache_stats():
+    """Response cache size and hit/miss counters."""
+    return response_cache.stats()
+
+
+@router.post("/cache/invalidate")
+async def cache_invalidate(application_id: Optional[str] = None, object_type: Optional[str] = None, all: bool = False):
+    """
+    Purge cached gateway responses for an application (fivestarId), an object
+    type, or everything. On-disk snapshots of the same data are dropped too.
+    """
+    if all:
+        return {"removed": response_cache.clear(), "snapshots_removed": await snapshot_store.clear()}
+    if not application_id and not object_type:
+        raise HTTPException(status_code=400, detail="Pass application_id, object_type or all=true")
+    return {
+        "removed": response_cache.invalidate(application_id=application_id, object_type=object_type),
+        "snapshots_removed": await snapshot_store.invalidate(application_id=application_id, object_type=object_type),
+    }
+
+
+@router.get("/snapshots")
+async def snapshot_stats():
+    """On-disk snapshot store size and fresh/stale/miss counters."""
+    return await snapshot_store.stats()
+
+
+@router.get("/versions")
+def version_stats():
+    """Hierarchy versions held for delta responses."""
+    return versions.stats()
@@ -0,0 +1,74 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
+
+import fast_json
+from upstream_governor import current_priority
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))  # applications built at the same time
+BATCH_MAX_APPLICATIONS = int(os.getenv("BATCH_MAX_APPLICATIONS", "1000"))
+
+
+# ------------------ 🧵 Batch Runner ------------------
+async def run_batch(application_names, build_one, workers=None, priority_class="batch"):
+    """
+    Build many application hierarchies with a fixed pool of workers and yield
+    each result as soon as it completes (completion order, not input order):
+        {"index": i, "application_name": name, "data": ...}
+        {"index": i, "application_name": name, "error": "..."}
+
+    Names are fed through a queue, so at most `workers` hierarchies are in
+    memory at once regardless of batch size. Session, connection pool and
+    response cache are process-wide and shared by every worker; upstream calls
+    run at the governor's `priority_class` ("batch"), behind interactive requests.
+    """
+    workers = max(1, min(workers or BATCH_WORKERS, len(application_names) or 1))
+    pending = asyncio.Queue()
+    for item in enumerate(application_names):
+        pending.put_nowait(item)
+    done = asyncio.Queue(maxsize=workers)
+
+    async def worker():
+        current_priority.set(priority_class)
+        while True:
+            try:
+                index, name = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                data = await build_one(name)
+                item = {"index": index, "application_name": name, "data": data}
+                if data is None:
+                    item = {"index": index, "application_name": name, "error": f"Application {name} not found."}
+            except Exception as e:
+                print(f"❌ Batch build failed for {name}: {e}")
+                item = {"index": index, "application_name": name, "error": str(e)}
+            await done.put(item)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        for _ in range(len(application_names)):
+            yield await done.get()
+    finally:
+        # 🛑 Client went away or the consumer stopped early: stop the remaining builds
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def ndjson_lines(items):
+    async for item in items:
+        yield fast_json.dumps(item) + b"\n"
+
+
+def ndjson_response(application_names, build_one, workers=None):
+    """StreamingResponse with one JSON line per application, written as each one completes."""
+    return StreamingResponse(
+        ndjson_lines(run_batch(application_names, build_one, workers)),
+        media_type="application/x-ndjson",
+    )
@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+
+import httpx
+import uvicorn
+
+from mock_gateway import seeded_mock, create_app
+
+
+# ------------------ 🧪 Mock Gateway ------------------
+def start_mock_gateway(mock):
+    """Serve `mock` on a free local port in a background thread → base URL."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(create_app(mock), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+def point_servers_at(base_url, cache, coalesce=False):
+    """
+    Env for the servers, set before they are imported (load_dotenv never overrides it).
+    Build coalescing is off unless asked for: workers request the same applications
+    at once, and merged builds would measure coalescing, not the traversal.
+    """
+    login_path = httpx.URL(os.getenv("LOGIN_URL") or "/login").path
+    os.environ["GATEWAY"] = base_url
+    os.environ["LOGIN_URL"] = base_url + login_path
+    os.environ["CACHE_ENABLED"] = "true" if cache else "false"
+    os.environ["COALESCE_BUILDS"] = "true" if coalesce else "false"
+
+
+# ------------------ 🎯 Targets ------------------
+async def graphql_target(args):
+    import main_strawberry
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main_strawberry.app), base_url="http://bench")
+    query = "query($name: String!, $mode: String, $stage: String) " \
+            "{ getApplicationHierarchy(applicationName: $name, mode: $mode, stage: $stage) }"
+
+    async def call(application_name):
+        res = await client.post("/graphql", json={
+            "query": query,
+            "variables": {"name": application_name, "mode": args.mode, "stage": args.stage},
+        })
+        body = res.json()
+        return res.status_code == 200 and not body.get("errors") and bool(body["data"]["getApplicationHierarchy"])
+
+    return client, call
+
+
+async def dynamic_target(args):
+    import main_dynamic
+    from stages import STAGES, DEFAULT_STAGE
+
+    stage = STAGES[args.stage or DEFAULT_STAGE]
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main_dynamic.app), base_url="http://bench")
+    res = await client.post("/profiles", json={"relation_map": stage.relation_map, "field_map": stage.field_map})
+    profile_id = res.json()["profile_id"]
+
+    async def call(application_name):
+        res = await client.post("/generate_hierarchy", json={
+            "application_name": application_name, "profile_id": profile_id, "mode": args.mode,
+        })
+        return res.status_code == 200 and "error" not in res.json()
+
+    return client, call
+
+
+TARGETS = {"graphql": graphql_target, "dynamic": dynamic_target}
+
+
+# ------------------ 🏁 Runner ------------------
+async def run_target(name, args, mock, applications):
+    client, call = await TARGETS[name](args)
+    latencies = []
+    errors = 0
+
+    async def one(application_name):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            ok = await call(application_name)
+        except Exception as e:
+            print(f"❌ {name} {application_name}: {e}")
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        errors += 0 if ok else 1
+
+    # 🔥 Warm-up: login, connection pool, plan compilation
+    for application_name in applications[: args.warmup]:
+        await one(application_name)
+    latencies.clear()
+    errors = 0
+    mock.reset()
+
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(applications[i % len(applications)])
+
+    async def worker():
+        while not queue.empty():
+            await one(queue.get_nowait())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    await client.aclose()
+
+    latencies.sort()
+    return {
+        "target": name,
+        "mode": args.mode or "default",
+        "cache": args.cache,
+        "coalesce": args.coalesce,
+        "requests": len(latencies),
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+        "upstream_calls_per_request": round(mock.total_calls() / len(latencies), 2) if latencies else None,
+        "logins": mock.logins,
+    }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return round(sorted_values[index] * 1000, 2)
+
+
+def print_report(results):
+    columns = ["target", "mode", "cache", "coalesce", "requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms",
+               "upstream_calls_per_request", "logins"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(widths[c]) for c in columns))
+
+
+async def main(args):
+    scale = tuple(int(n) for n in args.scale.lower().split("x")) if args.scale else None
+    mock = seeded_mock(scale=scale, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                       error_rate=args.error_rate, seed=args.seed)
+    point_servers_at(start_mock_gateway(mock), args.cache, args.coalesce)
+
+    applications = args.applications.split(",") if args.applications else (
+        [name for name in mock.applications if "-x" in name] if scale else mock.applications
+    )
+    print(f"🏁 {args.requests} requests × {', '.join(args.target)} over {', '.join(applications)}")
+
+    results = [await run_target(name, args, mock, applications) for name in args.target]
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark against the replaying mock gateway")
+    parser.add_argument("--target", nargs="+", choices=list(TARGETS), default=["graphql", "dynamic"])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--mode", help="concurrent | batched | bulk (server default if omitted)")
+    parser.add_argument("--stage", help="Strawberry stage / relation map to use (default stage if omitted)")
+    parser.add_argument("--applications", help="comma-separated application names (default: all seeded)")
+    parser.add_argument("--scale", help="benchmark synthetic applications of APPLICANTSxPROPERTIES, e.g. 20x10")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on (off by default)")
+    parser.add_argument("--coalesce", action="store_true", help="let concurrent builds of one application share a build")
+    parser.add_argument("--json", help="also write the results to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,109 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+
+from tracing import current_trace
+from upstream_governor import current_priority, governor, priority_name, SharedPriority
+from metrics import register_collector
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+COALESCE_BUILDS = os.getenv("COALESCE_BUILDS", "true").lower() in ("1", "true", "yes")
+
+
+# ------------------ 🤝 Build Coalescing ------------------
+class BuildCoalescer:
+    """
+    Cross-request single-flight for hierarchy builds: while a build for a key
+    (stage profile, application) is running, identical requests wait on it
+    instead of starting their own, and all receive the same result object
+    (treat it as read-only).
+
+    Each waiter keeps its own cancellation: a cancelled waiter stops waiting,
+    but the build goes on for the others and is only cancelled when nobody
+    is waiting for it any more. Nothing is kept once the build finishes, and
+    a finished or cancelled build is never joined.
+
+    The build's upstream calls run at the most urgent priority class among
+    its waiters: an interactive request joining a batch or prefetch build
+    lifts it (and its queued calls) to interactive.
+    """
+
+    def __init__(self, enabled=COALESCE_BUILDS):
+        self.enabled = enabled
+        self._flights = {}  # key → [task, waiters, SharedPriority]
+        self.builds = 0
+        self.joined = 0
+
+    async def run(self, key, build):
+        """Result of `build()` (a coroutine function), shared with concurrent calls for `key`."""
+        if not self.enabled or current_trace.get() is not None:
+            return await build()  # 🔬 a traced build must record its own upstream calls
+
+        flight = self._live(key)
+        if flight is None:
+            shared = SharedPriority(priority_name())
+            token = current_priority.set(shared)  # 🚦 the task copies this context
+            try:
+                task = asyncio.ensure_future(build())
+            finally:
+                current_priority.reset(token)
+            flight = self._flights[key] = [task, 0, shared]
+            task.add_done_callback(lambda t: self._land(key, t))
+            self.builds += 1
+        else:
+            self.joined += 1
+            governor.raise_priority(flight[2], priority_name())
+            print(f"🤝 Joining in-flight build {key}")
+
+        flight[1] += 1
+        try:
+            return await asyncio.shield(flight[0])
+        except asyncio.CancelledError:
+            if not flight[0].done() and flight[1] == 1:
+                flight[0].cancel()  # last waiter gone: nobody needs this build
+                self._land(key, flight[0])
+            raise
+        finally:
+            flight[1] -= 1
+
+    def joining(self, key):
+        """True if a call for `key` now would join a running build."""
+        return self.enabled and current_trace.get() is None and self._live(key) is not None
+
+    def _live(self, key):
+        """The flight for `key` if its build can still be joined."""
+        flight = self._flights.get(key)
+        if flight is None or flight[0].done() or flight[0].cancelling():
+            return None
+        return flight
+
+    def _land(self, key, task):
+        flight = self._flights.get(key)
+        if flight is not None and flight[0] is task:
+            del self._flights[key]
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "waiters": sum(flight[1] for flight in self._flights.values()),
+            "builds": self.builds,
+            "joined": self.joined,
+        }
+
+
+# Shared by every server in the process
+coalescer = BuildCoalescer()
+
+
+@register_collector
+def _coalescing_metrics():
+    return {
+        "hierarchy_builds_started_total": ("Hierarchy builds started by the coalescer", "counter", [({}, coalescer.builds)]),
+        "hierarchy_builds_joined_total": (
+            "Requests that shared an identical in-flight build", "counter", [({}, coalescer.joined)],
+        ),
+    }
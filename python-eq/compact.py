@@ -0,0 +1,65 @@
+# ------------------ 🗜️ Compact Payloads ------------------
+# Opt-in output shaping for slow links, applied to an assembled hierarchy:
+# - nulls are dropped (projected fields a record does not have)
+# - empty-children stubs and the lists they leave empty are dropped
+# - with dedupe, a record repeated under several parents is emitted once and
+#   referenced afterwards as {"$ref": fivestarId}
+# Clients treat a missing key as null / an empty list.
+
+COMPACT_MODES = ("1", "true", "dedupe")
+
+
+def compact_mode(value):
+    """(enabled, dedupe) from a `compact` argument: "1"/"true" or "dedupe"."""
+    if value in (None, False, ""):
+        return False, False
+    value = str(value).lower()
+    if value not in COMPACT_MODES:
+        return False, False
+    return True, value == "dedupe"
+
+
+def compact(hierarchy, dedupe=False):
+    """Compacted copy of `hierarchy`; the input is left untouched (it may be cached or versioned)."""
+    seen = {} if dedupe else None
+    return _compact_value(hierarchy, seen)
+
+
+def _compact_value(value, seen):
+    if isinstance(value, dict):
+        return _compact_record(value, seen)
+    if isinstance(value, list):
+        items = []
+        for item in value:
+            compacted = _compact_value(item, seen)
+            if compacted not in (None, {}, []):
+                items.append(compacted)
+        return items
+    return value
+
+
+def _compact_record(record, seen):
+    compacted = {}
+    for key, value in record.items():
+        if value is None:
+            continue
+        value = _compact_value(value, seen)
+        if value == [] and isinstance(record[key], list):
+            continue  # empty relation, or a list that only held stubs
+        compacted[key] = value
+
+    rec_id = compacted.get("fivestarId")
+    if seen is None or not rec_id:
+        return compacted
+    previous = seen.get(rec_id)
+    if previous is None:
+        seen[rec_id] = compacted
+        return compacted
+    # ♻️ Same record reached through another parent: reference the first copy
+    return {"$ref": rec_id} if previous == compacted else compacted
+
+
+def apply_compact(hierarchy, value):
+    """`hierarchy` shaped per a `compact` argument; returned unchanged when compaction is off."""
+    enabled, dedupe = compact_mode(value)
+    return compact(hierarchy, dedupe) if enabled and hierarchy else hierarchy
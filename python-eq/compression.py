@@ -0,0 +1,138 @@
+import os
+import zlib
+from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))  # smaller responses go out as is
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+try:
+    import brotli  # opt-in, not in requirements.txt: `pip install brotli` enables Content-Encoding: br
+except ImportError:
+    brotli = None
+
+
+# ------------------ 🗜️ Codecs ------------------
+class _Gzip:
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        # Sync flush: every streamed chunk (NDJSON line, subtree) reaches the client right away
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b""):
+        return self._z.compress(data) + self._z.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def chunk(self, data):
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self, data=b""):
+        return self._c.process(data) + self._c.finish()
+
+
+CODECS = {"gzip": _Gzip}
+if brotli is not None:
+    CODECS = {"br": _Brotli, **CODECS}  # preferred when the client accepts both
+
+
+def negotiate(accept_encoding):
+    """Best supported encoding the client accepts (q > 0), or None."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip().removeprefix("q=") if params.strip().startswith("q=") else "1"
+        try:
+            if float(q) > 0:
+                accepted.add(name.strip().lower())
+        except ValueError:
+            continue
+    for encoding in CODECS:
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+
+# ------------------ 🧩 Middleware ------------------
+class CompressionMiddleware:
+    """
+    Compresses HTTP responses of at least `minimum_size` bytes with the best
+    encoding negotiated from Accept-Encoding (br when installed, else gzip).
+    Streaming responses are compressed chunk by chunk without buffering.
+    WebSocket traffic and already-encoded responses pass through.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _Responder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _Responder:
+    def __init__(self, app, encoding, minimum_size):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start = None
+        self.codec = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message  # held until the first body chunk shows the size
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.codec is None:
+            headers = MutableHeaders(scope=self.start)
+            if "content-encoding" in headers or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+
+            self.codec = CODECS[self.encoding]()
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": self.codec.chunk(body), "more_body": True})
+            else:
+                data = self.codec.finish(body)
+                headers["Content-Length"] = str(len(data))
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": data})
+            return
+
+        data = self.codec.chunk(body) if more_body else self.codec.finish(body)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
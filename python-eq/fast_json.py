@@ -0,0 +1,94 @@
+import os
+import json
+import argparse
+from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
+from strawberry.fastapi import GraphQLRouter
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto").lower()  # auto | orjson | stdlib
+
+
+def _orjson():
+    """orjson module when selected and installed, else None (stdlib json is used)."""
+    if JSON_BACKEND == "stdlib":
+        return None
+    try:
+        import orjson
+        return orjson
+    except ImportError:
+        if JSON_BACKEND == "orjson":
+            print("⚠️ JSON_BACKEND=orjson but orjson is not installed; using stdlib json")
+        return None
+
+
+orjson = _orjson()
+BACKEND = "orjson" if orjson else "stdlib"
+
+
+# ------------------ ⚡ Encode / Decode ------------------
+def loads(data):
+    """Decode JSON from bytes or str (gateway bodies are decoded straight from bytes)."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, sort_keys=False):
+    """Encode to UTF-8 bytes; values JSON does not know (dates, Decimals) become strings."""
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, default=str, option=option)
+    return json.dumps(obj, default=str, sort_keys=sort_keys, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """FastAPI response class encoding with the fast backend (use as default_response_class)."""
+
+    def render(self, content):
+        return dumps(content)
+
+
+class FastJSONGraphQLRouter(GraphQLRouter):
+    """GraphQLRouter that parses requests and serializes results with the fast backend."""
+
+    def parse_json(self, data):
+        return loads(data)
+
+    def encode_json(self, response_data):
+        return dumps(response_data).decode("utf-8")
+
+
+# ------------------ 🏁 Benchmark ------------------
+def benchmark(path, number):
+    """Decode + encode a recorded hierarchy with stdlib json and the fast backend; returns ms per operation."""
+    import timeit
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    doc = json.loads(raw)
+    candidates = {
+        "stdlib": (json.loads, lambda obj: json.dumps(obj).encode("utf-8")),
+        BACKEND: (loads, dumps),
+    }
+    results = {"fixture": path, "bytes": len(raw), "backend": BACKEND}
+    for name, (decode, encode) in candidates.items():
+        results[name] = {
+            "decode_ms": round(timeit.timeit(lambda: decode(raw), number=number) / number * 1000, 3),
+            "encode_ms": round(timeit.timeit(lambda: encode(doc), number=number) / number * 1000, 3),
+        }
+    if BACKEND != "stdlib":
+        for op in ("decode_ms", "encode_ms"):
+            results[f"{op.split('_')[0]}_speedup"] = round(results["stdlib"][op] / results[BACKEND][op], 1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="stdlib json vs the fast JSON backend on a recorded hierarchy")
+    parser.add_argument("--fixture", default="../FIV-C_APP-0001.json")
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.fixture, args.number), indent=2))
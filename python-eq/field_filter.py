@@ -37,43 +37,89 @@ def load_field_map_from_json(file_path="./fieldMap.json"):
 
 
 # ---------------- 🔎 Filter Fields ----------------
-def filter_fields_by_list(data, allowed_fields, strict=True):
+def normalize_field_name(s):
+    if not s:
+        return ""
+    return (
+        str(s)
+        .replace(" ", "")
+        .replace("(", "")
+        .replace(")", "")
+        .replace("-", "")
+        .replace("_", "")
+        .lower()
+    )
+
+
+class FieldProjector:
+    """
+    Precompiled filter_fields_by_list for one allowed-field list.
+    Allowed fields are normalized once at compile time, and the mapping from a
+    record's key set to the output fields is memoized per key shape (records of
+    the same object share their key sets), so projecting a record is a single
+    pass over a precomputed (output field, record key) list.
+    """
+
+    MAX_SHAPES = 64
+
+    def __init__(self, allowed_fields):
+        self.allowed_fields = list(allowed_fields) if isinstance(allowed_fields, list) else []
+        self._normalized = [(field, normalize_field_name(field)) for field in self.allowed_fields]
+        self._shapes = {}
+
+    def plan_for(self, record):
+        shape = tuple(record)
+        plan = self._shapes.get(shape)
+        if plan is None:
+            record_lookup = {normalize_field_name(k): k for k in shape}
+            plan = [(field, record_lookup.get(norm)) for field, norm in self._normalized]
+            if len(self._shapes) >= self.MAX_SHAPES:
+                self._shapes.clear()
+            self._shapes[shape] = plan
+        return plan
+
+    def project(self, data, strict=True):
+        if not isinstance(data, list):
+            return []
+
+        filtered_list = []
+        for record in data:
+            if not isinstance(record, dict):
+                continue
+            filtered = {field: record.get(orig) if orig else None for field, orig in self.plan_for(record)}
+
+            if record.get("fivestarId"):
+                filtered["fivestarId"] = record["fivestarId"]
+            if record.get("Id"):
+                filtered["Id"] = record["Id"]
+
+            if not strict and not filtered:
+                filtered_list.append(record)
+            else:
+                filtered_list.append(filtered)
+        return filtered_list
+
+
+def compile_field_map(field_map):
+    """Build one FieldProjector per object of a loaded field map."""
+    return {obj: FieldProjector(fields) for obj, fields in field_map.items()}
+
+
+_projectors = {}
+
+
+def get_projector(allowed_fields):
+    """Projector for an ad-hoc allowed-field list, reused while the same list object is passed in."""
     if not isinstance(allowed_fields, list):
         allowed_fields = []
-    if not isinstance(data, list):
-        return []
-
-    def normalize(s):
-        if not s:
-            return ""
-        return (
-            str(s)
-            .replace(" ", "")
-            .replace("(", "")
-            .replace(")", "")
-            .replace("-", "")
-            .replace("_", "")
-            .lower()
-        )
-
-    filtered_list = []
-    for record in data:
-        if not isinstance(record, dict):
-            continue
-        filtered = {}
-        record_lookup = {normalize(k): k for k in record.keys()}
-
-        for field in allowed_fields:
-            orig = record_lookup.get(normalize(field))
-            filtered[field] = record.get(orig) if orig else None
-
-        if record.get("fivestarId"):
-            filtered["fivestarId"] = record["fivestarId"]
-        if record.get("Id"):
-            filtered["Id"] = record["Id"]
-
-        if not strict and not filtered:
-            filtered_list.append(record)
-        else:
-            filtered_list.append(filtered)
-    return filtered_list
+    key = id(allowed_fields)
+    cached = _projectors.get(key)
+    if cached is None or cached[0] is not allowed_fields:
+        if len(_projectors) >= 256:
+            _projectors.clear()
+        cached = _projectors[key] = (allowed_fields, FieldProjector(allowed_fields))
+    return cached[1]
+
+
+def filter_fields_by_list(data, allowed_fields, strict=True):
+    return get_projector(allowed_fields).project(data, strict=strict)
@@ -0,0 +1,429 @@
+import os
+import asyncio
+import time
+from urllib.parse import quote, urlsplit
+import httpx
+from dotenv import load_dotenv
+
+from session_manager import SessionManager
+from response_cache import response_cache, current_application
+from snapshot_store import snapshot_store
+import fast_json
+from hierarchy_engine import group_by_field
+from tracing import start_call, finish_call
+from resilience import call_upstream, UpstreamUnavailable
+from upstream_governor import governor as default_governor
+from metrics import gateway_requests, gateway_latency, gateway_payload_bytes, gateway_in_flight, gateway_logins, register_collector
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+ORG_ID = os.getenv("ORG_ID")
+APP_FORM_ID = os.getenv("APP_FORM_ID")
+LOGIN_ID = os.getenv("LOGIN_ID")
+CLIENT_ID = os.getenv("CLIENT_ID")
+LOGIN_URL = os.getenv("LOGIN_URL")
+GATEWAY = os.getenv("GATEWAY")
+
+GATEWAY_POOL_SIZE = int(os.getenv("GATEWAY_POOL_SIZE", "20"))  # connections per host
+GATEWAY_KEEPALIVE_SECONDS = float(os.getenv("GATEWAY_KEEPALIVE_SECONDS", "60"))
+GATEWAY_CONNECT_TIMEOUT = float(os.getenv("GATEWAY_CONNECT_TIMEOUT", "5"))
+GATEWAY_READ_TIMEOUT = float(os.getenv("GATEWAY_READ_TIMEOUT", "30"))
+GATEWAY_POOL_TIMEOUT = float(os.getenv("GATEWAY_POOL_TIMEOUT", "30"))
+GATEWAY_HTTP2 = os.getenv("GATEWAY_HTTP2", "false").lower() in ("1", "true", "yes")
+
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "50"))
+BATCH_FILTER_STYLE = os.getenv("BATCH_FILTER_STYLE", "csv")  # csv: f=a,b | repeat: f=a&f=b
+
+
+# ------------------ 📊 Pool Statistics ------------------
+class PoolStats:
+    """Per-host connection usage, collected from httpcore trace events."""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def as_dict(self):
+        reused = self.requests - self.new_connections
+        return {
+            "requests": self.requests,
+            "connections_opened": self.new_connections,
+            "connections_in_use": self.in_use,
+            "max_connections_in_use": self.max_in_use,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else None,
+            "avg_wait_ms": round(self.wait_seconds_total / self.requests * 1000, 3) if self.requests else None,
+            "max_wait_ms": round(self.wait_seconds_max * 1000, 3),
+        }
+
+
+# ------------------ 🌐 Gateway Client ------------------
+class GatewayClient:
+    """
+    Keep-alive HTTP transport shared by every server in the process.
+    One pooled httpx.AsyncClient per upstream host (gateway, login), with
+    explicit connect/read/pool timeouts and optional HTTP/2. Every call is
+    admitted by the process-wide UpstreamGovernor (in-flight cap, rate limit,
+    priority classes; see upstream_governor.py).
+    """
+
+    def __init__(
+        self,
+        pool_size=GATEWAY_POOL_SIZE,
+        keepalive_seconds=GATEWAY_KEEPALIVE_SECONDS,
+        connect_timeout=GATEWAY_CONNECT_TIMEOUT,
+        read_timeout=GATEWAY_READ_TIMEOUT,
+        pool_timeout=GATEWAY_POOL_TIMEOUT,
+        http2=GATEWAY_HTTP2,
+        governor=None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_seconds,
+        )
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout, read=read_timeout, write=read_timeout, pool=pool_timeout
+        )
+        self.http2 = http2 and _h2_available()
+        self.governor = governor or default_governor
+        self._clients = {}
+        self._stats = {}
+
+    def _client_for(self, host):
+        client = self._clients.get(host)
+        if client is None:
+            client = self._clients[host] = httpx.AsyncClient(
+                limits=self.limits, timeout=self.timeout, http2=self.http2
+            )
+            self._stats[host] = PoolStats()
+        return client
+
+    async def request(self, method, url, headers=None, timeout=None):
+        """`timeout` (seconds) caps every phase of this call below the configured timeouts."""
+        host = urlsplit(url).netloc
+        client = self._client_for(host)
+        stats = self._stats[host]
+        seen = {"first": None, "connected": False}
+
+        options = {"extensions": {"trace": None}}
+        if timeout is not None:
+            options["timeout"] = httpx.Timeout(
+                connect=min(self.timeout.connect, timeout),
+                read=min(self.timeout.read, timeout),
+                write=min(self.timeout.write, timeout),
+                pool=min(self.timeout.pool, timeout),
+            )
+
+        async def trace(event_name, info):
+            if seen["first"] is None:
+                seen["first"] = time.perf_counter()
+            if event_name.startswith("connection.connect_tcp"):
+                seen["connected"] = True
+
+        async with self.governor.slot():
+            # ⏱️ Timed from admission: governor queueing is in gateway_governor_wait_seconds
+            started = time.perf_counter()
+            stats.in_use += 1
+            stats.max_in_use = max(stats.max_in_use, stats.in_use)
+            gateway_in_flight.inc(host=host)
+            try:
+                options["extensions"]["trace"] = trace
+                return await client.request(method, url, headers=headers, **options)
+            finally:
+                stats.in_use -= 1
+                gateway_in_flight.dec(host=host)
+                stats.requests += 1
+                stats.new_connections += 1 if seen["connected"] else 0
+                wait = (seen["first"] or time.perf_counter()) - started
+                stats.wait_seconds_total += wait
+                stats.wait_seconds_max = max(stats.wait_seconds_max, wait)
+
+    def stats(self):
+        return {
+            "config": {
+                "pool_size_per_host": self.limits.max_connections,
+                "keepalive_seconds": self.limits.keepalive_expiry,
+                "connect_timeout": self.timeout.connect,
+                "read_timeout": self.timeout.read,
+                "http2": self.http2,
+            },
+            "hosts": {host: stats.as_dict() for host, stats in self._stats.items()},
+        }
+
+    async def aclose(self):
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+
+def _h2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("⚠️ GATEWAY_HTTP2 requested but the 'h2' package is not installed; using HTTP/1.1")
+        return False
+
+
+gateway = GatewayClient()
+
+def pool_stats():
+    return gateway.stats()
+
+
+@register_collector
+def _pool_metrics():
+    hosts = gateway.stats()["hosts"]
+    return {
+        "gateway_connections_opened_total": (
+            "Upstream connections opened", "counter",
+            [({"host": host}, stats["connections_opened"]) for host, stats in hosts.items()],
+        ),
+    }
+
+
+# ------------------ 🔐 Session ------------------
+async def login():
+    try:
+        res = await gateway.request(
+            "POST",
+            LOGIN_URL,
+            headers={
+                "fs-api-key": CLIENT_ID,
+                "fs-organization-id": ORG_ID,
+                "fs-user-id": LOGIN_ID,
+            },
+        )
+        res.raise_for_status()
+    except Exception:
+        gateway_logins.inc(result="failure")
+        raise
+    gateway_logins.inc(result="success")
+    data = res.json()
+    session_id = data.get("data", {}).get("sessionId")
+    print("✅ Session ID:", session_id)
+    return session_id
+
+
+# Shared by every entry point running in this process
+gateway_session = SessionManager(login)
+
+
+# ------------------ 🌐 Fetch JSON ------------------
+async def fetch_json(url, object_name=None):
+    data, _ = await fetch_json_checked(url, object_name)
+    return data
+
+
+async def fetch_json_checked(url, object_name=None, call=None):
+    """
+    fetch_json that also reports whether the data is safe to cache (a JSON list of records).
+    `call` is the trace entry of this lookup (see tracing.start_call), if tracing is on.
+    Each GET runs under resilience.call_upstream (deadline, retries, hedging and
+    the circuit breaker of its form ID) and raises UpstreamUnavailable when it gives up.
+    A final non-2xx answer or an undecodable body raises UpstreamUnavailable too
+    (reason: the status code, or "invalid_json"), so the build reports the
+    subtree as missing instead of returning it empty.
+    """
+    form_id = urlsplit(url).path.rsplit("/", 1)[-1]
+
+    async def get(session_id):
+        return await call_upstream(
+            form_id,
+            lambda timeout: _get_with_session(url, session_id, object_name, call, timeout),
+            object_name,
+        )
+
+    session_id = await gateway_session.get()
+    res = await get(session_id)
+    if is_invalid_session(res):
+        # 🔐 Session expired upstream: re-authenticate once and retry
+        print("🔐 Session rejected by gateway, logging in again")
+        gateway_session.invalidate(session_id)
+        res = await get(await gateway_session.get())
+    label = object_name or form_id
+    if not res.is_success:
+        raise UpstreamUnavailable(f"{label}: gateway answered HTTP {res.status_code}", reason=str(res.status_code))
+    try:
+        data = fast_json.loads(res.content)
+    except Exception:
+        print(f"⚠️ Invalid JSON from: {url}")
+        raise UpstreamUnavailable(f"{label}: invalid JSON from gateway", reason="invalid_json") from None
+    return data, isinstance(data, list)
+
+
+async def _get_with_session(url, session_id, object_name=None, call=None, timeout=None):
+    headers = {
+        "x-session-id": session_id,
+        "fs-api-key": CLIENT_ID,
+        "fs-organization-id": ORG_ID,
+        "fs-user-id": LOGIN_ID,
+    }
+    object_name = object_name or "unknown"
+    started = time.perf_counter()
+    try:
+        res = await gateway.request("GET", url, headers=headers, timeout=timeout)
+    except Exception:
+        gateway_requests.inc(object=object_name, status="error")
+        gateway_latency.observe(time.perf_counter() - started, object=object_name, status="error")
+        raise
+    gateway_requests.inc(object=object_name, status=res.status_code)
+    gateway_latency.observe(time.perf_counter() - started, object=object_name, status=res.status_code)
+    gateway_payload_bytes.observe(len(res.content), object=object_name)
+    if call is not None:
+        call["bytes"] += len(res.content)
+        call["status"] = res.status_code
+    return res
+
+
+def is_invalid_session(res):
+    return res.status_code == 401 or (res.status_code == 403 and "session" in res.text.lower())
+
+
+async def _from_snapshot(key, refresh):
+    """Records from the on-disk snapshot (revalidated in the background when stale), or None."""
+    snapshot = await snapshot_store.get_records(key)
+    if snapshot is None:
+        return None
+    records, stale = snapshot
+    if stale:
+        snapshot_store.refresh_later(key, refresh)
+    return records
+
+
+# ------------------ 🔍 Fetch by Parent ------------------
+async def fetch_by_parent_field(form_id, parent_field, parent_id, object_name=None):
+    """
+    Records of `form_id` whose `parent_field` is `parent_id`. `object_name` is
+    the caller's name for the form (see QueryPlan.form_objects): it labels logs,
+    metrics and traces, and selects the cache TTL and invalidation group.
+    """
+    key = (form_id, parent_field, parent_id)
+    call = start_call(form_id, object_name, parent_field, [parent_id])
+    cached = response_cache.get(key, object_name)
+    if cached is not None:
+        finish_call(call, cached, cache="hit")
+        return cached
+    snapshot = await _from_snapshot(key, lambda: fetch_by_parent_field(form_id, parent_field, parent_id, object_name))
+    if snapshot is not None:
+        finish_call(call, snapshot, cache="snapshot")
+        return snapshot
+
+    url = f"{GATEWAY}/incomming/configdata/{ORG_ID}/{form_id}?{parent_field}={parent_id}"
+    print(f"📡 Fetching {object_name} via {parent_field}={parent_id}")
+    data, cacheable = await fetch_json_checked(url, object_name, call)
+    data = data if isinstance(data, list) else []
+    finish_call(call, data)
+    if cacheable:
+        response_cache.put(key, data, object_name, app_ids=(current_application.get(),))
+        snapshot_store.put_records(key, data, object_name, current_application.get())
+    return data
+
+
+async def fetch_by_parent_ids(form_id, parent_field, parent_ids, object_name=None):
+    """
+    Batched fetch_by_parent_field: one multi-value filter request per chunk of
+    parent IDs that are not already cached. Fetched records are split back per
+    parent ID so later single or batched lookups hit the cache.
+    """
+    records = []
+    missing = []
+    hits = []
+    snapshot_hits = []
+    stale = []
+    uncached = []
+    for pid in parent_ids:
+        cached = response_cache.get((form_id, parent_field, pid), object_name)
+        if cached is not None:
+            hits.append(pid)
+            records.extend(cached)
+        else:
+            uncached.append(pid)
+    snapshots = await snapshot_store.get_records_many([(form_id, parent_field, pid) for pid in uncached])
+    for pid in uncached:
+        snapshot = snapshots.get((form_id, parent_field, pid))
+        if snapshot is None:
+            missing.append(pid)
+            continue
+        snapshot_hits.append(pid)
+        records.extend(snapshot[0])
+        if snapshot[1]:
+            stale.append(pid)
+    if hits:
+        finish_call(start_call(form_id, object_name, parent_field, hits), records, cache="hit")
+    if snapshot_hits:
+        finish_call(start_call(form_id, object_name, parent_field, snapshot_hits), records, cache="snapshot")
+    if stale:
+        snapshot_store.refresh_later((form_id, parent_field, tuple(stale)),
+                                     lambda: fetch_by_parent_ids(form_id, parent_field, stale, object_name))
+
+    chunks = [missing[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(missing), BATCH_CHUNK_SIZE)]
+
+    async def fetch_chunk(chunk):
+        if BATCH_FILTER_STYLE == "repeat":
+            query = "&".join(f"{parent_field}={pid}" for pid in chunk)
+        else:
+            query = f"{parent_field}={','.join(chunk)}"
+        url = f"{GATEWAY}/incomming/configdata/{ORG_ID}/{form_id}?{query}"
+        print(f"📦 Fetching {object_name} via {parent_field} for {len(chunk)} parents")
+        call = start_call(form_id, object_name, parent_field, chunk)
+        data, cacheable = await fetch_json_checked(url, object_name, call)
+        data = data if isinstance(data, list) else []
+        finish_call(call, data)
+        return data, cacheable
+
+    results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+    app_id = current_application.get()
+    for chunk, (data, cacheable) in zip(chunks, results):
+        if cacheable:
+            grouped = group_by_field(data, parent_field)
+            for pid in chunk:
+                response_cache.put((form_id, parent_field, pid), grouped.get(pid, []), object_name, app_ids=(app_id,))
+            snapshot_store.put_records_many(
+                [((form_id, parent_field, pid), grouped.get(pid, [])) for pid in chunk], object_name, app_id
+            )
+        records.extend(data)
+    return records
+
+
+async def fetch_applications_by_field(field, value):
+    """
+    Application records whose `field` equals `value` (e.g. Stage__c = "Process Credit").
+    Never cached: used to discover which applications are active right now.
+    """
+    url = f"{GATEWAY}/incomming/configdata/{ORG_ID}/{APP_FORM_ID}?{field}={quote(str(value))}"
+    print(f"🔎 Listing Application__c via {field}={value}")
+    call = start_call(APP_FORM_ID, "Application__c", field, [value])
+    data, _ = await fetch_json_checked(url, "Application__c", call)
+    data = data if isinstance(data, list) else []
+    finish_call(call, data)
+    return data
+
+
+async def fetch_application_by_name(application_name):
+    key = (APP_FORM_ID, "Name", application_name)
+    call = start_call(APP_FORM_ID, "Application__c", "Name", [application_name])
+    cached = response_cache.get(key, "Application__c")
+    if cached is not None:
+        finish_call(call, cached, cache="hit")
+        return cached
+    snapshot = await _from_snapshot(key, lambda: fetch_application_by_name(application_name))
+    if snapshot is not None:
+        finish_call(call, snapshot, cache="snapshot")
+        return snapshot
+
+    app_url = f"{GATEWAY}/incomming/configdata/{ORG_ID}/{APP_FORM_ID}?Name={application_name}"
+    data, cacheable = await fetch_json_checked(app_url, "Application__c", call)
+    data = data if isinstance(data, list) else []
+    finish_call(call, data)
+    if cacheable and data:
+        app_ids = [rec.get("fivestarId") for rec in data if isinstance(rec, dict)]
+        response_cache.put(key, data, "Application__c", app_ids=app_ids)
+        snapshot_store.put_records(key, data, "Application__c", app_ids[0] if app_ids else None)
+    return data
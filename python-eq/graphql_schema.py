@@ -0,0 +1,150 @@
+import re
+import time
+from typing import List, Optional
+
+import strawberry
+from graphql import GraphQLError
+from strawberry.dataloader import DataLoader
+from strawberry.extensions import SchemaExtension
+from strawberry.scalars import JSON
+
+from gateway_client import fetch_by_parent_field, fetch_by_parent_ids, fetch_application_by_name
+from hierarchy_engine import group_by_field
+from request_memo import RequestMemo
+from resilience import UpstreamUnavailable, deadline_scope, HIERARCHY_DEADLINE_SECONDS
+from response_cache import current_application
+
+GRAPHQL_NAME = re.compile(r"^[_A-Za-z][_0-9A-Za-z]*$")
+
+
+# ------------------ 🧬 Typed Schema ------------------
+def build_application_field(plan, prefix=""):
+    """
+    Generate Strawberry types for every node of a compiled plan (one type per
+    plan path, fields taken from the node's field projector) and return the
+    resolver for a typed `application(name)` root field.
+
+    Relation fields have their own resolvers backed by per-request DataLoaders,
+    so only the objects named in the selection set are fetched, and sibling
+    records share one batched gateway call per relation edge. Like the other
+    engines, every lookup of a request goes through one RequestMemo and runs
+    within HIERARCHY_DEADLINE_SECONDS of the request's first `application`
+    field; a relation whose lookup gives up resolves to null with a GraphQL
+    error (extensions: reason, path) instead of an empty list.
+    """
+    root_type = _build_type(plan.root, prefix, plan)
+
+    async def application(self, info, name: str):
+        with deadline_scope(at=_request_deadline(info)):
+            app_data = await fetch_application_by_name(name)
+        if not app_data:
+            return None
+        app_record = app_data[0]
+        current_application.set(app_record.get("fivestarId"))
+        projected = plan.root.projector.project([app_record], strict=True)
+        return root_type(record=projected[0] if projected else {})
+
+    application.__annotations__["return"] = Optional[root_type]
+    return strawberry.field(
+        resolver=application,
+        description=f"Typed {plan.root.object_name} hierarchy; only selected subtrees are fetched",
+    )
+
+
+def _build_type(node, prefix, plan):
+    type_name = prefix + "_".join(node.path.split("/")[1:] or [node.object_name])
+    namespace = {"__annotations__": {"record": strawberry.Private[dict]}}
+    used = set()
+
+    for index, field in enumerate(node.projector.allowed_fields + ["fivestarId", "Id"]):
+        graphql_name = field if GRAPHQL_NAME.match(field) else re.sub(r"\W+", "_", field).strip("_")
+        if not graphql_name or not GRAPHQL_NAME.match(graphql_name) or graphql_name in used:
+            continue
+        used.add(graphql_name)
+        namespace[f"field_{index}"] = strawberry.field(name=graphql_name, resolver=_value_resolver(field))
+
+    for index, child in enumerate(node.children):
+        if child.output_key in used:
+            continue
+        used.add(child.output_key)
+        child_type = _build_type(child, prefix, plan)
+        namespace[f"relation_{index}"] = strawberry.field(
+            name=child.output_key, resolver=_relation_resolver(child, child_type, prefix, plan)
+        )
+
+    cls = type(type_name, (), namespace)
+    return strawberry.type(cls, name=type_name, description=f"{node.object_name} at {node.path}")
+
+
+def _value_resolver(field):
+    def resolve(self) -> Optional[JSON]:
+        return self.record.get(field)
+
+    return resolve
+
+
+def _relation_resolver(node, child_type, prefix, plan):
+    # Optional: a relation that could not be fetched is null (with an error), not its whole parent
+    async def resolve(self, info) -> Optional[List[child_type]]:
+        record_id = self.record.get("fivestarId") or self.record.get("Id")
+        if not node.resolved or not record_id:
+            return []
+        try:
+            records = await _loader_for(info, node, prefix, plan).load(record_id)
+        except UpstreamUnavailable as e:
+            raise GraphQLError(
+                f"Incomplete subtree {node.path}: {e}", extensions={"reason": e.reason, "path": node.path},
+            ) from e
+        return [child_type(record=rec) for rec in records]
+
+    return resolve
+
+
+def _request_deadline(info):
+    """time.monotonic() deadline of this GraphQL request, started by its first typed lookup."""
+    if "typed_deadline" not in info.context:
+        seconds = HIERARCHY_DEADLINE_SECONDS
+        info.context["typed_deadline"] = time.monotonic() + seconds if seconds and seconds > 0 else None
+    return info.context["typed_deadline"]
+
+
+def _loader_for(info, node, prefix, plan):
+    """One DataLoader per request and plan node, stored on the GraphQL context with the plan's RequestMemo."""
+    loaders = info.context.setdefault("typed_loaders", {})
+    loader = loaders.get((prefix, node.path))
+    if loader is None:
+        memos = info.context.setdefault("typed_memos", {})
+        memo = memos.get(prefix)
+        if memo is None:
+            # No anchor: one request may select several applications
+            memo = memos[prefix] = RequestMemo(fetch_by_parent_field, fetch_by_parent_ids, plan.root.object_name,
+                                               object_names=plan.form_objects)
+        deadline = _request_deadline(info)
+
+        async def load(parent_ids):
+            with deadline_scope(at=deadline):
+                data = await memo.fetch_children_batch(node.form_id, node.join_field, list(parent_ids))
+            grouped = group_by_field(data, node.join_field)
+            return [node.projector.project(grouped.get(pid, []), strict=True) for pid in parent_ids]
+
+        loader = loaders[(prefix, node.path)] = DataLoader(load_fn=load)
+    return loader
+
+
+# ------------------ ♻️ Fetch Statistics ------------------
+class FetchStatsExtension(SchemaExtension):
+    """Expose per-request fetch counters that resolvers put in context["fetch_stats"] as extensions.fetchStats."""
+
+    def get_results(self):
+        context = self.execution_context.context
+        stats = context.get("fetch_stats") if isinstance(context, dict) else None
+        return {"fetchStats": stats} if stats else {}
+
+
+class TraceExtension(SchemaExtension):
+    """Expose request traces that resolvers put in context["traces"] as extensions.trace."""
+
+    def get_results(self):
+        context = self.execution_context.context
+        traces = context.get("traces") if isinstance(context, dict) else None
+        return {"trace": traces} if traces else {}
@@ -0,0 +1,253 @@
+import asyncio
+
+from tracing import trace_node
+from resilience import UpstreamUnavailable
+
+
+# ------------------ 🧭 Hierarchy Context ------------------
+class HierarchyContext:
+    """
+    Everything a single hierarchy build needs besides the compiled plan:
+    - fetch_children: async (form_id, join_field, parent_id) → list of raw records
+    - fetch_children_batch: async (form_id, join_field, parent_ids) → list of raw records
+      for all parents at once (defaults to one fetch_children call per parent)
+    - empty_stubs: emit a stub of empty child lists when an object has no records
+    - mode: traversal engine used by build_hierarchy ("concurrent", "batched" or "bulk")
+
+    `observed` collects [parents, records] per plan path for fan-out statistics.
+    `errors` lists the subtrees left out because their lookup gave up (deadline,
+    open circuit, retries exhausted); the rest of the tree is still built.
+    """
+
+    def __init__(self, fetch_children, empty_stubs=True, fetch_children_batch=None, mode="concurrent"):
+        self.fetch_children = fetch_children
+        self.fetch_children_batch = fetch_children_batch or self._fetch_each
+        self.empty_stubs = empty_stubs
+        self.mode = mode or "concurrent"
+        self.observed = {}
+        self.errors = []
+
+    async def _fetch_each(self, form_id, join_field, parent_ids):
+        results = await asyncio.gather(
+            *(self.fetch_children(form_id, join_field, pid) for pid in parent_ids)
+        )
+        return [rec for records in results for rec in records]
+
+    def observe(self, node, parents, records):
+        counts = self.observed.setdefault(node.path, [0, 0])
+        counts[0] += parents
+        counts[1] += records
+
+    def fail(self, node, parent_ids, error):
+        self.errors.append({
+            "path": node.path,
+            "object": node.object_name,
+            "parent_ids": list(parent_ids),
+            "reason": getattr(error, "reason", "error"),
+            "message": str(error),
+        })
+        print(f"⚠️ Incomplete subtree {node.path} for {len(parent_ids)} parent(s): {error}")
+
+    def empty_stub(self, node):
+        if node.children and self.empty_stubs:
+            return [{child.output_key: [] for child in node.children}]
+        return []
+
+
+# ------------------ 🔁 Concurrent Hierarchy ------------------
+async def fetch_hierarchy_by_tree(node, parent_id, ctx):
+    """
+    Fetch the records of plan `node` joined to `parent_id` and, concurrently,
+    every child subtree of every record. Latency follows the depth of the tree
+    rather than the number of gateway calls; the fetcher bounds the fan-out.
+    """
+    if not node.resolved:
+        return []
+
+    trace_node.set(node.path)
+    try:
+        data = await ctx.fetch_children(node.form_id, node.join_field, parent_id)
+    except UpstreamUnavailable as e:
+        ctx.fail(node, [parent_id], e)
+        return []
+    filtered = node.projector.project(data, strict=True) if data else []
+    ctx.observe(node, 1, len(filtered))
+
+    flattened_records = await asyncio.gather(*(_attach_children(rec, node, ctx) for rec in filtered))
+
+    # If no records exist at this level, return a stub showing empty children for completeness
+    return list(flattened_records) or ctx.empty_stub(node)
+
+
+async def fetch_children_by_tree(node, record_id, ctx):
+    """Fetch all child subtrees of one record concurrently → {child_key: records}."""
+    results = await asyncio.gather(
+        *(fetch_hierarchy_by_tree(child, record_id, ctx) for child in node.children)
+    )
+
+    # ✅ Always include the key, even if no data
+    return {
+        child.output_key: child_records if child_records else []
+        for child, child_records in zip(node.children, results)
+    }
+
+
+async def _attach_children(rec, node, ctx):
+    rec_id = rec.get("fivestarId") or rec.get("Id")
+    children = await fetch_children_by_tree(node, rec_id, ctx)
+    return {**rec, **children}
+
+
+# ------------------ 📦 Level-wise Batched Hierarchy ------------------
+async def fetch_children_batched(node, record_ids, ctx, load_edge=None):
+    """
+    DataLoader-style variant of fetch_children_by_tree for many records at once.
+    Each relation edge is fetched with a single batched call for all parent IDs
+    at that level, and the results are redistributed to their parents by the
+    join field → {record_id: {child_key: records}}.
+
+    `load_edge(form_id, join_field, parent_ids)` supplies the raw records of an
+    edge; it defaults to ctx.fetch_children_batch.
+    """
+    load_edge = load_edge or ctx.fetch_children_batch
+    per_child = await asyncio.gather(
+        *(_fetch_edge_batched(child, record_ids, ctx, load_edge) for child in node.children)
+    )
+
+    result = {rec_id: {} for rec_id in record_ids}
+    for child, by_parent in zip(node.children, per_child):
+        for rec_id in record_ids:
+            result[rec_id][child.output_key] = by_parent.get(rec_id) or []
+    return result
+
+
+async def _fetch_edge_batched(node, parent_ids, ctx, load_edge):
+    if not node.resolved:
+        return {}
+
+    wanted = list(dict.fromkeys(pid for pid in parent_ids if pid))
+    trace_node.set(node.path)
+    try:
+        data = await load_edge(node.form_id, node.join_field, wanted) if wanted else []
+    except UpstreamUnavailable as e:
+        ctx.fail(node, wanted, e)
+        return {}
+
+    # 🧺 Redistribute raw records to their parents before the join field is filtered away
+    grouped = group_by_field(data, node.join_field)
+    filtered = {pid: node.projector.project(grouped.get(pid, []), strict=True) for pid in wanted}
+    ctx.observe(node, len(wanted), sum(len(records) for records in filtered.values()))
+
+    record_ids = [rec.get("fivestarId") or rec.get("Id") for records in filtered.values() for rec in records]
+    grandchildren = await fetch_children_batched(node, record_ids, ctx, load_edge) if node.children else {}
+
+    by_parent = {}
+    for pid, records in filtered.items():
+        flattened_records = [
+            {**rec, **grandchildren.get(rec.get("fivestarId") or rec.get("Id"), {})} for rec in records
+        ]
+        by_parent[pid] = flattened_records or ctx.empty_stub(node)
+    return by_parent
+
+
+def group_by_field(records, field):
+    """Group raw records by the value of `field` (matched case-insensitively)."""
+    grouped = {}
+    lowered = field.lower()
+    for rec in records or []:
+        if not isinstance(rec, dict):
+            continue
+        key = rec.get(field)
+        if key is None:
+            key = next((v for k, v in rec.items() if k.lower() == lowered), None)
+        if key is not None:
+            grouped.setdefault(key, []).append(rec)
+    return grouped
+
+
+# ------------------ 🧱 Bulk Fetch + Hash-Join Hierarchy ------------------
+async def fetch_children_bulk(root, anchor_id, ctx):
+    """
+    Fetch every distinct object in the plan once, scoped to the anchor record
+    (e.g. Application__c=<fivestarId>), then stitch the nested structure in
+    memory using indexes of each record set keyed by its join field.
+
+    Upstream calls equal the number of distinct objects in the plan, no matter
+    how many applicants or properties the application has. An object whose
+    anchor-scoped set comes back empty may simply not carry the anchor key, so
+    its nested edges fall back to one batched call per edge.
+    """
+    load_edge = await _bulk_edge_loader(root, anchor_id, ctx)
+    return (await fetch_children_batched(root, [anchor_id], ctx, load_edge))[anchor_id]
+
+
+async def _bulk_edge_loader(root, anchor_id, ctx):
+    """Fetch the anchor-scoped record set of every object and return a load_edge that joins in memory."""
+    anchor = root.object_name
+    form_ids = list(dict.fromkeys(
+        node.form_id for child in root.children for node in child.walk() if node.resolved
+    ))
+    trace_node.set(f"{root.path} (bulk)")
+
+    async def scoped_set(form_id):
+        try:
+            return await ctx.fetch_children(form_id, anchor, anchor_id)
+        except UpstreamUnavailable:
+            return None  # retried per edge, where a second failure is reported
+
+    record_sets = await asyncio.gather(*(scoped_set(fid) for fid in form_ids))
+    scoped = dict(zip(form_ids, record_sets))
+    indexes = {}
+
+    async def load_edge(form_id, join_field, parent_ids):
+        records = scoped.get(form_id)
+        if not records:
+            if join_field == anchor and records is not None:
+                return []
+            return await ctx.fetch_children_batch(form_id, join_field, parent_ids)
+
+        index = indexes.get((form_id, join_field))
+        if index is None:
+            index = indexes[(form_id, join_field)] = group_by_field(records, join_field)
+        return [rec for pid in parent_ids for rec in index.get(pid, [])]
+
+    return load_edge
+
+
+# ------------------ 🚦 Engine Selection ------------------
+async def build_hierarchy(root, anchor_id, ctx):
+    """Fetch every child subtree of the anchor record (plan root) with the engine chosen by ctx.mode."""
+    if ctx.mode == "bulk":
+        return await fetch_children_bulk(root, anchor_id, ctx)
+    if ctx.mode == "batched":
+        return (await fetch_children_batched(root, [anchor_id], ctx))[anchor_id]
+    return await fetch_children_by_tree(root, anchor_id, ctx)
+
+
+# ------------------ 🌊 Streaming ------------------
+async def stream_hierarchy(root, anchor_id, ctx):
+    """
+    Yield (child_key, records) for each top-level child of the anchor as soon
+    as its whole subtree is built, in completion order. Merging every yielded
+    pair gives the same dict as build_hierarchy. In "bulk" mode the anchor-
+    scoped record sets are fetched before the first subtree is yielded.
+    """
+    if ctx.mode in ("bulk", "batched"):
+        load_edge = await _bulk_edge_loader(root, anchor_id, ctx) if ctx.mode == "bulk" else ctx.fetch_children_batch
+
+        async def subtree(child):
+            by_parent = await _fetch_edge_batched(child, [anchor_id], ctx, load_edge)
+            return child.output_key, by_parent.get(anchor_id) or []
+    else:
+        async def subtree(child):
+            return child.output_key, await fetch_hierarchy_by_tree(child, anchor_id, ctx) or []
+
+    tasks = [asyncio.ensure_future(subtree(child)) for child in root.children]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # 🛑 Consumer stopped early (e.g. client disconnected): drop the remaining subtrees
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,130 @@
+import os
+import hashlib
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from fast_json import dumps
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+VERSION_MAX_APPLICATIONS = int(os.getenv("VERSION_MAX_APPLICATIONS", "1000"))  # (profile, application) keys kept
+VERSION_HISTORY = int(os.getenv("VERSION_HISTORY", "5"))  # recent versions kept per key
+
+
+def version_of(hierarchy):
+    """Content hash of a hierarchy, stable across key order; doubles as its ETag."""
+    return hashlib.sha256(dumps(hierarchy, sort_keys=True)).hexdigest()[:16]
+
+
+# ------------------ 🩹 JSON Patch ------------------
+def json_patch(old, new, path=""):
+    """
+    RFC 6902 operations turning `old` into `new`. Objects are diffed per key;
+    lists of records per position when their fivestarIds line up (edits inside
+    a Deferral_Document__c stay small), otherwise the list is replaced whole.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(json_patch(old[key], value, child))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and _same_records(old, new):
+        ops = []
+        for i, (before, after) in enumerate(zip(old, new)):
+            ops.extend(json_patch(before, after, f"{path}/{i}"))
+        for i in range(len(old) - 1, len(new) - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{i}"})
+        for value in new[len(old):]:
+            ops.append({"op": "add", "path": f"{path}/-", "value": value})
+        return ops
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def _same_records(old, new):
+    """Shared prefix of both lists identifies the same records (or holds no IDs at all)."""
+    return all(_record_id(a) == _record_id(b) for a, b in zip(old, new))
+
+
+def _record_id(value):
+    return value.get("fivestarId") if isinstance(value, dict) else None
+
+
+def _escape(key):
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+# ------------------ 🗃️ Version Store ------------------
+class VersionStore:
+    """
+    Recent versions of each (profile, application) hierarchy, bounded per key
+    (VERSION_HISTORY) and across keys (LRU over VERSION_MAX_APPLICATIONS).
+    Hierarchies are stored as built and must not be mutated afterwards.
+    """
+
+    def __init__(self, max_applications=VERSION_MAX_APPLICATIONS, history=VERSION_HISTORY):
+        self.max_applications = max_applications
+        self.history = history
+        self._versions = OrderedDict()  # key → OrderedDict(version → hierarchy)
+
+    def record(self, key, hierarchy):
+        """Remember `hierarchy` under `key` and return its version."""
+        version = version_of(hierarchy)
+        versions = self._versions.setdefault(key, OrderedDict())
+        self._versions.move_to_end(key)
+        versions[version] = hierarchy
+        versions.move_to_end(version)
+        while len(versions) > self.history:
+            versions.popitem(last=False)
+        while len(self._versions) > self.max_applications:
+            self._versions.popitem(last=False)
+        return version
+
+    def get(self, key, version):
+        return self._versions.get(key, {}).get(version)
+
+    def delta(self, key, hierarchy, since=None):
+        """
+        Versioned response for `hierarchy`:
+        - {"version", "notModified": true} when `since` is the current version
+        - {"version", "since", "patch": [...]} when `since` is a version still held
+        - {"version", "data"} otherwise
+        """
+        version = self.record(key, hierarchy)
+        if since is None:
+            return {"version": version, "data": hierarchy}
+        if since == version:
+            return {"version": version, "notModified": True}
+        previous = self.get(key, since)
+        if previous is None:
+            return {"version": version, "data": hierarchy}
+        return {"version": version, "since": since, "patch": json_patch(previous, hierarchy)}
+
+    def stats(self):
+        return {
+            "applications": len(self._versions),
+            "versions": sum(len(v) for v in self._versions.values()),
+            "max_applications": self.max_applications,
+            "history": self.history,
+        }
+
+
+def if_none_match(request):
+    """Versions listed in an If-None-Match header (quotes and W/ stripped)."""
+    header = request.headers.get("if-none-match") if request is not None else None
+    if not header:
+        return []
+    return [tag.strip().removeprefix("W/").strip('"') for tag in header.split(",") if tag.strip()]
+
+
+versions = VersionStore()
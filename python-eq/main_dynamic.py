@@ -1,21 +1,41 @@
 import os
-import requests
+import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any
-
-from field_filter import load_field_map_from_json, filter_fields_by_list
+from typing import Dict, Any, List, Optional
+
+from field_filter import load_field_map_from_json
+from gateway_client import (
+    gateway,
+    fetch_by_parent_field,
+    fetch_by_parent_ids,
+    fetch_application_by_name,
+    BATCH_CHUNK_SIZE,
+)
+from response_cache import current_application
+from admin_api import router as admin_router
+from hierarchy_engine import HierarchyContext, build_hierarchy, stream_hierarchy
+from query_plan import explain_plan, fanout_stats
+from profile_registry import ProfileRegistry
+from hierarchy_versions import versions, if_none_match
+from request_memo import RequestMemo
+from tracing import RequestTrace, trace_options
+from metrics import observe_build, hierarchy_in_flight, router as metrics_router
+from batch_runner import ndjson_lines, ndjson_response, BATCH_MAX_APPLICATIONS
+from fast_json import FastJSONResponse
+from resilience import deadline_scope, start_deadline, UpstreamUnavailable
+from upstream_governor import priority
+from coalescing import coalescer
+from compact import apply_compact
+from compression import CompressionMiddleware
 
 load_dotenv()
 
 # ------------------ 🔧 ENV VARS ------------------
-ORG_ID = os.getenv("ORG_ID")
-APP_FORM_ID = os.getenv("APP_FORM_ID")
-LOGIN_ID = os.getenv("LOGIN_ID")
-CLIENT_ID = os.getenv("CLIENT_ID")
-LOGIN_URL = os.getenv("LOGIN_URL")
-GATEWAY = os.getenv("GATEWAY")
+HIERARCHY_MODE = os.getenv("HIERARCHY_MODE", "concurrent")  # concurrent | batched | bulk
 
 
 # ------------------ 📘 FORM → OBJECT MAP ------------------
@@ -41,168 +61,308 @@ FORM_TO_OBJECT = {
     os.getenv("FORM_TR_DEVIATION"): "Tr_Deviation__c",
 }
 
+# 🗂️ Compiled plans by content hash of their relation/field maps
+profiles = ProfileRegistry(FORM_TO_OBJECT)
 
-# ------------------ 🔐 SESSION ------------------
-def get_session_id():
-    res = requests.post(
-        LOGIN_URL,
-        headers={
-            "fs-api-key": CLIENT_ID,
-            "fs-organization-id": ORG_ID,
-            "fs-user-id": LOGIN_ID,
-        },
-    )
-    res.raise_for_status()
-    data = res.json()
-    session_id = data.get("data", {}).get("sessionId")
-    print("✅ Session ID:", session_id)
-    return session_id
-
-
-# ------------------ 🌐 FETCH HELPERS ------------------
-def fetch_json(url, session_id):
-    headers = {
-        "x-session-id": session_id,
-        "fs-api-key": CLIENT_ID,
-        "fs-organization-id": ORG_ID,
-        "fs-user-id": LOGIN_ID,
-    }
-    res = requests.get(url, headers=headers)
-    try:
-        return res.json()
-    except Exception:
-        print(f"⚠️ Invalid JSON from: {url}")
-        return []
 
+# ------------------ 🧠 REQUEST MODEL ------------------
+class HierarchyRequest(BaseModel):
+    application_name: str
+    profile_id: Optional[str] = None  # registered via POST /profiles; replaces relation_map + field_map
+    relation_map: Optional[Dict[str, Any]] = None
+    field_map: Optional[Dict[str, Any]] = None
+    mode: Optional[str] = None  # "concurrent" (default), "batched" or "bulk"
+    trace: Optional[str] = None  # "1" or "profile" (or X-Trace header): add extensions.trace to the response
+    since_version: Optional[str] = None  # ETag the client holds: answer with {"version", "patch"} against it
+    compact: Optional[str] = None  # "1": drop nulls and empty stubs, "dedupe": also $ref repeated records
+
+
+class BatchHierarchyRequest(BaseModel):
+    application_names: List[str]
+    profile_id: Optional[str] = None
+    relation_map: Optional[Dict[str, Any]] = None
+    field_map: Optional[Dict[str, Any]] = None
+    mode: Optional[str] = None
+    workers: Optional[int] = None  # defaults to BATCH_WORKERS
+    compact: Optional[str] = None
+
+
+class ProfileRequest(BaseModel):
+    relation_map: Dict[str, Any]
+    field_map: Dict[str, Any]
+    warm_applications: List[str] = []  # built in the background to pre-fill the response cache
 
-def fetch_by_parent_field(form_id, parent_field, parent_id, session_id):
-    url = f"{GATEWAY}/incomming/configdata/{ORG_ID}/{form_id}?{parent_field}={parent_id}"
-    print(f"📡 Fetching {FORM_TO_OBJECT.get(form_id)} via {parent_field}={parent_id}")
-    data = fetch_json(url, session_id)
-    return data if isinstance(data, list) else []
 
+def profile_for(req):
+    """Profile of a request: the registered one, or its inline maps (compiled once per content hash)."""
+    if req.profile_id:
+        profile = profiles.get(req.profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail=f"Unknown profile {req.profile_id}; register it via POST /profiles")
+        return profile
+    if req.relation_map is None or req.field_map is None:
+        raise HTTPException(status_code=400, detail="Pass profile_id, or relation_map and field_map")
+    profile, _ = profiles.register(req.relation_map, req.field_map)
+    return profile
 
-def to_api_name(name: str):
-    """Convert e.g. loan_applicant__c → Loan_Applicant__c"""
-    if not name:
-        return name
-    parts = name.split("__c")
-    return parts[0].capitalize() + "__c"
 
+def plan_for(req):
+    """Compiled plan of a request's profile."""
+    return profile_for(req).plan
 
-# ------------------ 🔁 RECURSIVE HIERARCHY ------------------
-def fetch_hierarchy_by_tree(object_name, parent_id, session_id, parent_object, tree_node, field_map):
+
+# ------------------ 🌳 BUILD ------------------
+async def build_application(application_name, plan, mode=None, fetch_stats=None):
     """
-    Recursively fetches child records for a given object and parent.
-    Uses the parent_id to filter results (e.g., Loan_Applicant__c = <fivestarId>).
+    Hierarchy of one application for a compiled plan, or None if the application
+    does not exist. Pass a dict as `fetch_stats` to receive the request memo counters.
+    Subtrees not fetched within HIERARCHY_DEADLINE_SECONDS are listed under
+    "errors" with "incomplete": true instead of failing the whole build.
+    Concurrent calls for the same plan and application share one build.
     """
-    form_id = next((fid for fid, obj in FORM_TO_OBJECT.items() if obj == object_name), None)
-    if not form_id:
-        print(f"⚠️ No form found for object: {object_name}")
-        return []
+    # The in-flight build holds `plan`, so its id cannot be reused while the key is live
+    key = (id(plan), application_name)
+    if fetch_stats is not None and coalescer.joining(key):
+        fetch_stats.update({"fetches": 0, "avoided": 0, "joined_build": True})
+
+    async def build():
+        with deadline_scope():
+            return await _build_application(application_name, plan, mode, fetch_stats)
 
-    # Join field inferred from parent
-    join_field = parent_object if parent_object else "Application__c"
+    return await coalescer.run(key, build)
 
-    # Fetch children filtered by parent_id
-    data = fetch_by_parent_field(form_id, join_field, parent_id, session_id)
-    if not data:
-        print(f"⚠️ No records found for {object_name} via {join_field}={parent_id}")
-        return []
 
-    # Filter only relevant fields
-    normalized_key = next((k for k in field_map.keys() if k.lower() == object_name.lower()), None)
-    allowed_fields = field_map.get(normalized_key, []) if normalized_key else []
-    filtered = filter_fields_by_list(data, allowed_fields, strict=True)
+async def _build_application(application_name, plan, mode, fetch_stats):
+    # Fetch base application record
+    app_data = await fetch_application_by_name(application_name)
+    if not app_data:
+        return None
 
-    flattened_records = []
+    app_record = app_data[0]
+    app_id = app_record.get("fivestarId")
+    current_application.set(app_id)
 
-    for rec in filtered:
-        rec_id = rec.get("fivestarId") or rec.get("Id")
-        flat_rec = {**rec}
+    # Filter base application fields
+    app_fields_arr = plan.root.projector.project([app_record], strict=True)
+    app_fields = app_fields_arr[0] if app_fields_arr else {}
 
-        # Recursive call for children
-        for child_obj, child_tree in (tree_node or {}).items():
-            print(f"➡ Fetching child {child_obj} under {object_name} ({rec_id})")
-            child_records = fetch_hierarchy_by_tree(
-                child_obj,
-                rec_id,
-                session_id,
-                object_name,
-                child_tree,
-                field_map,
-            )
+    # ♻️ Overlapping lookups within this build share one fetch
+    memo = RequestMemo(fetch_by_parent_field, fetch_by_parent_ids, plan.root.object_name, app_id,
+                       object_names=plan.form_objects)
+    ctx = HierarchyContext(
+        memo.fetch_children,
+        empty_stubs=False,
+        fetch_children_batch=memo.fetch_children_batch,
+        mode=mode or HIERARCHY_MODE,
+    )
 
-            flat_rec[to_api_name(child_obj)] = child_records if child_records else []
+    # Build result tree; sibling subtrees are fetched concurrently
+    started = time.perf_counter()
+    hierarchy_in_flight.inc(entry_point="generate_hierarchy")
+    try:
+        children = await build_hierarchy(plan.root, app_id, ctx)
+    except Exception:
+        observe_build("generate_hierarchy", ctx.mode, time.perf_counter() - started, ctx.observed, result="error")
+        raise
+    finally:
+        memo.close()
+        hierarchy_in_flight.dec(entry_point="generate_hierarchy")
+    observe_build("generate_hierarchy", ctx.mode, time.perf_counter() - started, ctx.observed,
+                  result="partial" if ctx.errors else "ok")
+    fanout_stats.record(application_name, ctx.observed)
+    print(f"♻️ {application_name}: {memo.stats()}")
+    if fetch_stats is not None:
+        fetch_stats.update(memo.stats())
+    result = {plan.root.object_name: {**app_fields, **children}}
+    if ctx.errors:
+        result.update({"incomplete": True, "errors": ctx.errors})
+    return result
 
-        flattened_records.append(flat_rec)
 
-    # Ensure child structure even if no records exist
-    if not flattened_records and tree_node:
-        empty_stub = {}
-        for child_obj in (tree_node or {}).keys():
-            empty_stub[to_api_name(child_obj)] = []
-        flattened_records.append(empty_stub)
+async def warm_application(application_name, plan):
+    """Background build that fills the caches, queued behind interactive upstream calls."""
+    with priority("prefetch"):
+        await build_application(application_name, plan)
 
-    return flattened_records
 
+async def stream_application(application_name, plan, mode=None):
+    """
+    build_application in chunks of {"path": [...], "data": ..., "hasNext": bool}:
+    the anchor's own fields first, then each top-level child as it completes.
+    Chunks after a subtree gave up also carry "incomplete" and "errors".
+    """
+    start_deadline()
+    app_data = await fetch_application_by_name(application_name)
+    if not app_data:
+        yield {"error": f"Application {application_name} not found.", "hasNext": False}
+        return
 
-# ------------------ 🧠 REQUEST MODEL ------------------
-class HierarchyRequest(BaseModel):
-    application_name: str
-    relation_map: Dict[str, Any]
-    field_map: Dict[str, Any]
+    app_record = app_data[0]
+    app_id = app_record.get("fivestarId")
+    current_application.set(app_id)
+
+    anchor = plan.root.object_name
+    app_fields_arr = plan.root.projector.project([app_record], strict=True)
+    remaining = len(plan.root.children)
+    yield {"path": [anchor], "data": app_fields_arr[0] if app_fields_arr else {}, "hasNext": remaining > 0}
+
+    # ♻️ Overlapping lookups within this build share one fetch
+    memo = RequestMemo(fetch_by_parent_field, fetch_by_parent_ids, plan.root.object_name, app_id,
+                       object_names=plan.form_objects)
+    ctx = HierarchyContext(
+        memo.fetch_children,
+        empty_stubs=False,
+        fetch_children_batch=memo.fetch_children_batch,
+        mode=mode or HIERARCHY_MODE,
+    )
+    started = time.perf_counter()
+    hierarchy_in_flight.inc(entry_point="generate_hierarchy_stream")
+    try:
+        reported = 0
+        async for child_key, records in stream_hierarchy(plan.root, app_id, ctx):
+            remaining -= 1
+            chunk = {"path": [anchor, child_key], "data": records, "hasNext": remaining > 0}
+            if len(ctx.errors) > reported:
+                chunk.update({"incomplete": True, "errors": ctx.errors[reported:]})
+                reported = len(ctx.errors)
+            yield chunk
+    finally:
+        memo.close()
+        hierarchy_in_flight.dec(entry_point="generate_hierarchy_stream")
+    observe_build("generate_hierarchy_stream", ctx.mode, time.perf_counter() - started, ctx.observed,
+                  result="partial" if ctx.errors else "ok")
+    fanout_stats.record(application_name, ctx.observed)
+    print(f"♻️ {application_name}: {memo.stats()}")
 
 
 # ------------------ 🚀 FASTAPI APP ------------------
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await gateway.aclose()
 
 
-@app.post("/generate_hierarchy")
-def generate_hierarchy(req: HierarchyRequest):
-    session_id = get_session_id()
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware)
+app.include_router(admin_router)
+app.include_router(metrics_router)
 
-    # Anchor: Application__c
-    anchor = list(req.relation_map.keys())[0]
-    print(f"🔗 Starting from anchor: {anchor}")
 
-    # Fetch base application record
-    app_url = f"{GATEWAY}/incomming/configdata/{ORG_ID}/{APP_FORM_ID}?Name={req.application_name}"
-    app_data = fetch_json(app_url, session_id)
-    if not app_data:
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable(request, exc):
+    """The application lookup itself gave up (subtrees that give up are reported in the result instead)."""
+    return FastJSONResponse({"error": str(exc), "reason": exc.reason}, status_code=503)
+
+
+@app.post("/generate_hierarchy")
+async def generate_hierarchy(req: HierarchyRequest, request: Request, response: Response):
+    # Anchor: Application__c
+    hierarchy_profile = profile_for(req)
+    plan = hierarchy_profile.plan
+    print(f"🔗 Starting from anchor: {plan.root.object_name}")
+
+    fetch_stats = {}
+    enabled, profile = trace_options(request, req.trace)
+    if enabled:
+        # 🔬 Opt-in waterfall of every upstream call, arranged like the relation map
+        with RequestTrace(req.application_name, profile) as request_trace:
+            result = await build_application(req.application_name, plan, req.mode, fetch_stats)
+        response.headers["X-Trace"] = request_trace.header()
+    else:
+        result = await build_application(req.application_name, plan, req.mode, fetch_stats)
+    if result is None:
         return {"error": f"Application {req.application_name} not found."}
+    result = apply_compact(result, req.compact)
+
+    # 🏷️ Versioned by content: If-None-Match → 304, since_version → JSON Patch
+    delta = versions.delta((hierarchy_profile.profile_id, req.application_name, req.compact), result, req.since_version)
+    etag = f'"{delta["version"]}"'
+    if delta["version"] in if_none_match(request):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    # ♻️ Per-request memo counters: lookups served without calling the gateway
+    response.headers["X-Gateway-Fetches"] = str(fetch_stats["fetches"])
+    response.headers["X-Avoided-Fetches"] = str(fetch_stats["avoided"])
+    if req.since_version is not None:
+        result = delta
+    if enabled:
+        result = {**result, "extensions": {"trace": request_trace.report(plan)}}
+    return result
 
-    app_record = app_data[0]
-    app_id = app_record.get("fivestarId")
 
-    # Filter base application fields
-    normalized_app_key = next((k for k in req.field_map if k.lower() == anchor.lower()), None)
-    allowed_app_fields = req.field_map.get(normalized_app_key, [])
-    app_fields_arr = filter_fields_by_list([app_record], allowed_app_fields, strict=True)
-    app_fields = app_fields_arr[0] if app_fields_arr else {}
+@app.post("/generate_hierarchy/stream")
+async def generate_hierarchy_stream(req: HierarchyRequest):
+    """
+    /generate_hierarchy as newline-delimited JSON: the application's fields as
+    soon as it is found, then one line per top-level child as its subtree resolves.
+    """
+    plan = plan_for(req)
+    return StreamingResponse(
+        ndjson_lines(stream_application(req.application_name, plan, req.mode)),
+        media_type="application/x-ndjson",
+    )
 
-    # Build result tree
-    result = {anchor: {**app_fields}}
-
-    # Iterate over child objects
-    for child_obj, child_tree in req.relation_map[anchor].items():
-        child_key = to_api_name(child_obj)
-        child_records = fetch_hierarchy_by_tree(
-            child_obj,
-            app_id,
-            session_id,
-            anchor,
-            child_tree,
-            req.field_map,
-        )
-        result[anchor][child_key] = child_records if child_records else []
 
-    return result
+@app.post("/generate_hierarchy/batch")
+async def generate_hierarchy_batch(req: BatchHierarchyRequest):
+    """
+    Hierarchies for many applications as newline-delimited JSON, one line per
+    application in completion order: {"index", "application_name", "data" | "error"}.
+    """
+    if len(req.application_names) > BATCH_MAX_APPLICATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_APPLICATIONS} applications per batch")
+
+    plan = plan_for(req)
+
+    async def build_one(application_name):
+        return apply_compact(await build_application(application_name, plan, req.mode), req.compact)
+
+    return ndjson_response(req.application_names, build_one, req.workers)
+
+
+@app.post("/explain")
+def explain(req: HierarchyRequest):
+    """Compiled plan for the posted relation/field maps with estimated gateway calls per engine."""
+    plan = plan_for(req)
+    return explain_plan(plan, req.application_name, BATCH_CHUNK_SIZE)
+
+
+@app.post("/profiles")
+async def register_profile(req: ProfileRequest, background_tasks: BackgroundTasks):
+    """
+    Register a relation/field map pair once and get back its content-hash ID.
+    Later requests send {"profile_id": ...} instead of the maps.
+    """
+    profile, created = profiles.register(req.relation_map, req.field_map)
+    for application_name in req.warm_applications:
+        background_tasks.add_task(warm_application, application_name, profile.plan)
+    return {**profile.summary(), "created": created}
+
+
+@app.get("/profiles")
+def list_profiles():
+    return profiles.list()
+
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    profile = profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile {profile_id}")
+    return {**profile.summary(), "relation_map": profile.relation_map, "field_map": profile.field_map}
+
+
+@app.delete("/profiles/{profile_id}")
+def delete_profile(profile_id: str):
+    if not profiles.remove(profile_id):
+        raise HTTPException(status_code=404, detail=f"Unknown profile {profile_id}")
+    return {"removed": profile_id}
 
 
 @app.get("/")
 def root():
-    return {"message": "POST /generate_hierarchy with relation_map, field_map, and application_name"}
+    return {"message": "POST /generate_hierarchy with application_name and either profile_id or relation_map + field_map"}
 
 
 if __name__ == "__main__":
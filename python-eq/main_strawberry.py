@@ -1,228 +1,241 @@
-import os
-import requests
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from field_filter import load_field_map_from_json, filter_fields_by_list
+from gateway_client import gateway, BATCH_CHUNK_SIZE
+from admin_api import router as admin_router
+from metrics import router as metrics_router
+from query_plan import explain_plan
+from graphql_schema import build_application_field, FetchStatsExtension, TraceExtension
+from tracing import RequestTrace, trace_options
+from batch_runner import run_batch, ndjson_lines, ndjson_response, BATCH_MAX_APPLICATIONS
+from stages import STAGES, DEFAULT_STAGE
+from hierarchy_versions import versions, if_none_match
+from fast_json import FastJSONResponse, FastJSONGraphQLRouter
+from compact import apply_compact
+from compression import CompressionMiddleware
+from resilience import UpstreamUnavailable
+from prefetcher import prefetcher, router as prefetch_router, PREFETCH_ENABLED
 import strawberry
-from fastapi import FastAPI
-from strawberry.fastapi import GraphQLRouter
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from strawberry.scalars import JSON
+from strawberry.types import Info
+from typing import AsyncGenerator, List, Optional
 
 load_dotenv()
 
 
-# ------------------ 🔧 ENV VARS ------------------
-ORG_ID = os.getenv("ORG_ID")
-APP_FORM_ID = os.getenv("APP_FORM_ID")
-LOGIN_ID = os.getenv("LOGIN_ID")
-CLIENT_ID = os.getenv("CLIENT_ID")
-LOGIN_URL = os.getenv("LOGIN_URL")
-GATEWAY = os.getenv("GATEWAY")
-
-# ------------------ 📘 FORM → OBJECT MAP ------------------
-FORM_TO_OBJECT = {
-    os.getenv("FORM_APPLICATION"): "Application__c",
-    os.getenv("FORM_PROPERTY"): "Property__c",
-    os.getenv("FORM_LOAN_APPLICANT"): "Loan_Applicant__c",
-    os.getenv("FORM_CAPABILITY"): "Capability__c",
-    os.getenv("FORM_LOAN_DETAILS"): "Loan_Details__c",
-    os.getenv("FORM_CONTENT_VERSION"): "ContentVersion",
-    os.getenv("FORM_CASHFLOW"): "Cashflow__c",
-    os.getenv("FORM_CHARACTER"): "Character__c",
-    os.getenv("FORM_PROPERTY_OWNERS"): "Property_Owners__c",
-    os.getenv("FORM_BUREAU_HIGHMARK"): "Bureau_Highmark__c",
-    os.getenv("FORM_COMMON_OBJECT"): "Commonobject__c",
-    os.getenv("FORM_DEDUPE_DETAIL"): "Dedupe_Detail__c",
-    os.getenv("FORM_DEFERRAL_DOCUMENT"): "Deferral_Document__c",
-    os.getenv("FORM_FEE_CREATION"): "Fee_Creation__c",
-    os.getenv("FORM_LOAN_LIEN_LINKING"): "Loan_Lien_Linking__c",
-    os.getenv("FORM_RECEIPT"): "Receipt__c",
-    os.getenv("FORM_SANCTION_CONDITION"): "Sanction_Condition__c",
-    os.getenv("FORM_TOPUP"): "Topup__c",
-    os.getenv("FORM_TR_DEVIATION"): "Tr_Deviation__c",
-    os.getenv("FORM_FORM_REVISIT") : "Revisit__c",
-    os.getenv("FORM_GEO_LOCATION") : "Form_Geo_Location__c",
-    os.getenv("FORM_VERIFICATION") : "Verification__c"
-}
-
-# ------------------ 🔗 RELATION MAP ------------------
-RELATION_MAP = {
-    "Application__c": {
-        "Capability__c": {"ContentVersion": {}},
-        "Cashflow__c": {"ContentVersion": {}},
-        "Character__c": {"Property_Owners__c": {}},
-        "CommonObject__c": {},
-        "Deferral_Document__c": {},
-        "Fee_Creation__c": {},
-        "Loan_Applicant__c": {
-            "Bureau_Highmark__c": {"Loan_Details__c": {}},
-            "Capability__c":{},
-            "Cashflow__c":{},
-            "Character__c":{},
-            "ContentVersion":{},
-            "Dedupe_Details__c": {},
-            "Fee_Creation__c": {},
-            "Loan_Details__c": {},
-            "Property__c": {
-                "CommonObject__c": {},
-                "Deferral_Document__c": {},
-                "Fee_Creation__c": {},
-                "Property_Owners__c": {},
-                "Tr_Deviation__c": {}
-            },
-            "Property_Owners__c" : {},
-            "Reciept__c" : {},
-            "Tr_Deviation__c" : {}
-        },
-        "Loan_Lien_Linking__c": {},
-        "Property__c": {},
-        "Reciept__c": {},
-        "Sanction_Condition__c": {},
-        "Topup__c": {},
-        "Tr_Deviation__c": {}
-    }
-}
-
-
-# ------------------ 📘 Load Field Map ------------------
-field_map = load_field_map_from_json("./filtered_fieldMap.json")
-
-# ------------------ 🔐 Session ------------------
-def get_session_id():
-    res = requests.post(
-        LOGIN_URL,
-        headers={
-            "fs-api-key": CLIENT_ID,
-            "fs-organization-id": ORG_ID,
-            "fs-user-id": LOGIN_ID,
-        },
-    )
-    res.raise_for_status()
-    data = res.json()
-    session_id = data.get("data", {}).get("sessionId")
-    print("✅ Session ID:", session_id)
-    return session_id
-
-
-# ------------------ 🌐 Fetch JSON ------------------
-def fetch_json(url, session_id):
-    headers = {
-        "x-session-id": session_id,
-        "fs-api-key": CLIENT_ID,
-        "fs-organization-id": ORG_ID,
-        "fs-user-id": LOGIN_ID,
-    }
-    res = requests.get(url, headers=headers)
-    try:
-        return res.json()
-    except Exception:
-        print(f"⚠️ Invalid JSON from: {url}")
-        return []
-
-
-# ------------------ 🔍 Fetch by Parent ------------------
-def fetch_by_parent_field(form_id, parent_field, parent_id, session_id):
-    url = f"{GATEWAY}/incomming/configdata/{ORG_ID}/{form_id}?{parent_field}={parent_id}"
-    print(f"📡 Fetching {FORM_TO_OBJECT.get(form_id)} via {parent_field}={parent_id}")
-    data = fetch_json(url, session_id)
-    return data if isinstance(data, list) else []
-
-
-# ------------------ 🔠 Utility ------------------
-def to_api_name(name: str):
-    if not name:
-        return name
-    parts = name.split("__c")
-    return parts[0].capitalize() + "__c"
-
-
-# ------------------ 🔁 Recursive Hierarchy ------------------
-def fetch_hierarchy_by_tree(object_name, parent_id, session_id, parent_object, tree_node):
-    form_id = next((fid for fid, obj in FORM_TO_OBJECT.items() if obj == object_name), None)
-    if not form_id:
-        return []
-
-    # 🔁 Join field inferred directly from parent name
-    join_field = parent_object if parent_object else "Application__c"
-
-    data = fetch_by_parent_field(form_id, join_field, parent_id, session_id)
-
-    # Even if data is empty, we'll still traverse children (for consistent key structure)
-    normalized_key = next((k for k in field_map.keys() if k.lower() == object_name.lower()), None)
-    allowed_fields = field_map.get(normalized_key, []) if normalized_key else []
-    filtered = filter_fields_by_list(data, allowed_fields, strict=True) if data else []
-
-    flattened_records = []
-
-    # If there are records, process them normally
-    for rec in filtered:
-        rec_id = rec.get("fivestarId") or rec.get("Id")
-        flat_rec = {**rec}
-
-        # Recursively fetch children for each record
-        for child_obj, child_tree in (tree_node or {}).items():
-            child_key = to_api_name(child_obj)
-            child_records = fetch_hierarchy_by_tree(child_obj, rec_id, session_id, object_name, child_tree)
-            # ✅ Always include the key, even if no data
-            flat_rec[child_key] = child_records if child_records else []
-
-        flattened_records.append(flat_rec)
-
-    # If no records exist at this level, we still return an empty list (no recursion)
-    if not flattened_records and tree_node:
-        # Return a stub structure showing empty children for completeness
-        empty_stub = {}
-        for child_obj in (tree_node or {}).keys():
-            child_key = to_api_name(child_obj)
-            empty_stub[child_key] = []
-        flattened_records.append(empty_stub)
-
-    return flattened_records
+# ------------------ 🎭 Stages ------------------
+# Approval Credit and FIV-C are served by this one app (see stages.py). GraphQL
+# picks a stage with the `stage` argument, else by route (/<stage>/graphql),
+# else DEFAULT_STAGE; REST routes take a `stage` parameter.
+def get_stage(name=None):
+    stage = STAGES.get(name or DEFAULT_STAGE)
+    if stage is None:
+        raise HTTPException(status_code=404, detail=f"Unknown stage {name}; available: {', '.join(STAGES)}")
+    return stage
+
+
+def stage_for(info, stage=None):
+    name = stage or info.context.get("stage") or DEFAULT_STAGE
+    if name not in STAGES:
+        raise ValueError(f"Unknown stage {name}; available: {', '.join(STAGES)}")
+    return STAGES[name]
+
+
+class BatchRequest(BaseModel):
+    application_names: List[str]
+    mode: Optional[str] = None
+    workers: Optional[int] = None  # defaults to BATCH_WORKERS
+    stage: Optional[str] = None
+    compact: Optional[str] = None  # "1" or "dedupe", see compact.py
 
 
 # ------------------ 🧠 GraphQL ------------------
 @strawberry.type
-class Query:
+class HierarchyQuery:
     # type: ignore[reportInvalidTypeForm]
     @strawberry.field
-    def get_application_hierarchy(self, application_name: str) -> JSON:
-        """Fetch full application hierarchy by name"""
-        session_id = get_session_id()
-        app_url = f"{GATEWAY}/incomming/configdata/{ORG_ID}/{APP_FORM_ID}?Name={application_name}"
-        app_data = fetch_json(app_url, session_id)
-        if not app_data:
+    async def get_application_hierarchy(
+        self,
+        info: Info,
+        application_name: str,
+        mode: Optional[str] = None,
+        stage: Optional[str] = None,
+        trace: Optional[str] = None,
+        compact: Optional[str] = None,
+    ) -> JSON:
+        """
+        Fetch full application hierarchy by name ("trace": "1" or "profile", or the X-Trace header, adds extensions.trace;
+        "compact": "1" drops nulls and empty stubs, "dedupe" also references repeated records by fivestarId)
+        """
+        selected = stage_for(info, stage)
+        fetch_stats = info.context.setdefault("fetch_stats", {}).setdefault(application_name, {})
+        enabled, profile = trace_options(info.context.get("request"), trace)
+        if not enabled:
+            return apply_compact(await selected.build(application_name, mode, fetch_stats), compact) or {}
+
+        # 🔬 Opt-in waterfall of every upstream call, arranged like the stage's RELATION_MAP
+        with RequestTrace(application_name, profile) as request_trace:
+            result = await selected.build(application_name, mode, fetch_stats)
+        info.context.setdefault("traces", {})[application_name] = request_trace.report(selected.plan)
+        if info.context.get("response") is not None:
+            info.context["response"].headers["X-Trace"] = request_trace.header()
+        return apply_compact(result, compact) or {}
+
+    @strawberry.field
+    async def get_application_hierarchy_delta(
+        self,
+        info: Info,
+        application_name: str,
+        since_version: Optional[str] = None,
+        mode: Optional[str] = None,
+        stage: Optional[str] = None,
+        compact: Optional[str] = None,
+    ) -> JSON:
+        """getApplicationHierarchy with a version: notModified, a JSON Patch against sinceVersion, or the full data"""
+        selected = stage_for(info, stage)
+        fetch_stats = info.context.setdefault("fetch_stats", {}).setdefault(application_name, {})
+        result = apply_compact(await selected.build(application_name, mode, fetch_stats), compact)
+        if result is None:
             return {}
+        return versions.delta((selected.profile_key, application_name, compact), result, since_version)
 
-        app_record = app_data[0]
-        app_id = app_record.get("fivestarId")
 
-        normalized_app_key = next((k for k in field_map if k == "Application__c"), None)
-        allowed_app_fields = field_map.get(normalized_app_key, [])
-        app_fields_arr = filter_fields_by_list([app_record], allowed_app_fields, strict=True)
-        app_fields = app_fields_arr[0] if app_fields_arr else {}
+# 🧬 Typed hierarchies generated from each stage's field map; only selected relations are fetched.
+# `application` is the default stage, the others are `<stage>Application`.
+Query = strawberry.type(type("Query", (HierarchyQuery,), {
+    ("application" if name == DEFAULT_STAGE else f"{name}_application"): build_application_field(stage.plan, stage.type_prefix)
+    for name, stage in STAGES.items()
+}))
 
-        top_key = to_api_name("Application__c")
-        app_result = {top_key: {**app_fields}}
 
-        for child_obj, child_tree in RELATION_MAP["Application__c"].items():
-            child_key = to_api_name(child_obj)
-            child_records = fetch_hierarchy_by_tree(child_obj, app_id, session_id, "Application__c", child_tree)
-            # ✅ Always include child keys, even when no data
-            app_result[top_key][child_key] = child_records if child_records else []
+@strawberry.type
+class Subscription:
+    @strawberry.subscription
+    async def application_hierarchies(
+        self,
+        info: Info,
+        application_names: List[str],
+        mode: Optional[str] = None,
+        workers: Optional[int] = None,
+        stage: Optional[str] = None,
+    ) -> AsyncGenerator[JSON, None]:
+        """Hierarchies for many applications, one event per application as each completes"""
+        if len(application_names) > BATCH_MAX_APPLICATIONS:
+            raise ValueError(f"At most {BATCH_MAX_APPLICATIONS} applications per batch")
+        selected = stage_for(info, stage)
+        async for item in run_batch(application_names, lambda name: selected.build(name, mode), workers):
+            yield item
+
+    @strawberry.subscription
+    async def application_hierarchy_stream(
+        self, info: Info, application_name: str, mode: Optional[str] = None, stage: Optional[str] = None
+    ) -> AsyncGenerator[JSON, None]:
+        """getApplicationHierarchy delivered incrementally, one event per completed top-level subtree"""
+        async for chunk in stage_for(info, stage).stream(application_name, mode):
+            yield chunk
 
 
-        return app_result
 
+# ------------------ 🚀 FastAPI + Strawberry ------------------
+schema = strawberry.Schema(Query, subscription=Subscription, extensions=[FetchStatsExtension, TraceExtension])
+graphql_app = FastJSONGraphQLRouter(schema)
 
 
-# ------------------ 🚀 FastAPI + Strawberry ------------------
-schema = strawberry.Schema(Query)
-graphql_app = GraphQLRouter(schema)
-app = FastAPI()
+def stage_router(name):
+    """GraphQL endpoint whose default stage is `name`."""
+    async def get_context():
+        return {"stage": name}
+
+    return FastJSONGraphQLRouter(schema, context_getter=get_context)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if PREFETCH_ENABLED:
+        prefetcher.start()  # 🔥 keep active applications warm, see prefetcher.py
+    yield
+    await prefetcher.stop()
+    await gateway.aclose()
+
+
+# ⚡ orjson (when installed) for request parsing and response encoding, see fast_json.py
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+# 🗜️ gzip (br with the brotli package) per Accept-Encoding, above COMPRESSION_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
 app.include_router(graphql_app, prefix="/graphql")
+for stage_name in STAGES:
+    app.include_router(stage_router(stage_name), prefix=f"/{stage_name}/graphql")
+app.include_router(admin_router)
+app.include_router(prefetch_router)
+app.include_router(metrics_router)
+
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable(request, exc):
+    """The application lookup itself gave up (subtrees that give up are reported in the result instead)."""
+    return FastJSONResponse({"error": str(exc), "reason": exc.reason}, status_code=503)
+
 
 @app.get("/")
 def root():
-    return {"message": "Go to /graphql for GraphQL Playground"}
+    return {"message": "Go to /graphql for GraphQL Playground", "stages": list(STAGES), "default_stage": DEFAULT_STAGE}
+
+
+@app.get("/hierarchy")
+async def hierarchy(
+    application_name: str,
+    request: Request,
+    response: Response,
+    mode: Optional[str] = None,
+    stage: Optional[str] = None,
+    since_version: Optional[str] = None,
+    compact: Optional[str] = None,
+):
+    """
+    getApplicationHierarchy over REST with an ETag: If-None-Match → 304,
+    since_version → {"version", "patch"} (RFC 6902) against that version.
+    """
+    selected = get_stage(stage)
+    result = apply_compact(await selected.build(application_name, mode), compact)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Application {application_name} not found.")
+    delta = versions.delta((selected.profile_key, application_name, compact), result, since_version)
+    etag = f'"{delta["version"]}"'
+    if delta["version"] in if_none_match(request):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return delta if since_version is not None else result
+
+
+@app.get("/hierarchy/stream")
+async def hierarchy_stream(application_name: str, mode: Optional[str] = None, stage: Optional[str] = None):
+    """getApplicationHierarchy as newline-delimited JSON chunks, flushed as each top-level subtree completes."""
+    return StreamingResponse(
+        ndjson_lines(get_stage(stage).stream(application_name, mode)),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post("/hierarchy/batch")
+async def hierarchy_batch(req: BatchRequest):
+    """Same hierarchies as getApplicationHierarchy for many applications, streamed as newline-delimited JSON."""
+    if len(req.application_names) > BATCH_MAX_APPLICATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_APPLICATIONS} applications per batch")
+    stage = get_stage(req.stage)
+
+    async def build_one(application_name):
+        return apply_compact(await stage.build(application_name, req.mode), req.compact)
+
+    return ndjson_response(req.application_names, build_one, req.workers)
+
+
+@app.get("/explain")
+def explain(application_name: Optional[str] = None, stage: Optional[str] = None):
+    """Compiled RELATION_MAP plan of a stage with estimated gateway calls per engine."""
+    return explain_plan(get_stage(stage).plan, application_name, BATCH_CHUNK_SIZE)
+
 
 if __name__ == "__main__":
     import uvicorn
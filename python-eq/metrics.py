@@ -0,0 +1,184 @@
+import bisect
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+
+# ------------------ 📏 Metric Types ------------------
+# Minimal in-process metrics rendered in the Prometheus text format, so
+# /metrics works without prometheus_client or any collector sidecar.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{self._label_text(key)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+    def dec(self, value=1, **labels):
+        self.inc(-value, **labels)
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]  # bucket counts, sum, count
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def totals(self):
+        """(sum, count) over every label set, e.g. for an overall average."""
+        return sum(s[1] for s in self._values.values()), sum(s[2] for s in self._values.values())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{self._label_text(key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._label_text(key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+REGISTRY = []
+COLLECTORS = []  # callables returning {name: (help, type, [(labels_dict, value), ...])} at scrape time
+
+
+def register_collector(collect):
+    """Add a callable whose gauges are computed when /metrics is scraped (e.g. cache size)."""
+    COLLECTORS.append(collect)
+    return collect
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for collect in COLLECTORS:
+        for name, (help_text, kind, samples) in collect().items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_number(value)}" if label_text else f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ------------------ 📊 Metrics ------------------
+gateway_requests = Counter(
+    "gateway_requests_total", "Upstream gateway data calls", ["object", "status"]
+)
+gateway_latency = Histogram(
+    "gateway_request_duration_seconds", "Upstream gateway data call latency", ["object", "status"]
+)
+gateway_payload_bytes = Histogram(
+    "gateway_response_bytes", "Upstream response body size", ["object"], buckets=BYTES_BUCKETS
+)
+gateway_in_flight = Gauge(
+    "gateway_requests_in_flight", "Upstream calls currently holding a connection slot", ["host"]
+)
+gateway_logins = Counter("gateway_logins_total", "Gateway login attempts", ["result"])
+gateway_retries = Counter("gateway_retries_total", "Upstream calls retried", ["object", "reason"])
+gateway_hedges = Counter("gateway_hedged_requests_total", "Hedged duplicate upstream calls", ["object", "winner"])
+governor_wait = Histogram(
+    "gateway_governor_wait_seconds", "Time upstream calls waited for admission", ["priority"]
+)
+gateway_rejected = Counter(
+    "gateway_calls_rejected_total", "Upstream calls not attempted (open circuit, spent deadline)", ["object", "reason"]
+)
+
+hierarchy_builds = Counter(
+    "hierarchy_builds_total", "Hierarchy builds", ["entry_point", "mode", "result"]
+)
+hierarchy_latency = Histogram(
+    "hierarchy_build_duration_seconds", "Hierarchy build latency", ["entry_point", "mode"]
+)
+hierarchy_in_flight = Gauge("hierarchy_builds_in_flight", "Hierarchy builds in progress", ["entry_point"])
+node_parents = Counter(
+    "hierarchy_node_parents_total", "Parent records looked up per plan node", ["entry_point", "node"]
+)
+node_records = Counter(
+    "hierarchy_node_records_total", "Records returned per plan node", ["entry_point", "node"]
+)
+
+
+def observe_build(entry_point, mode, seconds, observed, result="ok"):
+    """Record one finished hierarchy build; `observed` is HierarchyContext.observed."""
+    hierarchy_builds.inc(entry_point=entry_point, mode=mode, result=result)
+    hierarchy_latency.observe(seconds, entry_point=entry_point, mode=mode)
+    for path, (parents, records) in (observed or {}).items():
+        node_parents.inc(parents, entry_point=entry_point, node=path)
+        node_records.inc(records, entry_point=entry_point, node=path)
+
+
+# ------------------ 📡 Route ------------------
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of upstream, cache and hierarchy metrics."""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
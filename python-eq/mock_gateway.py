@@ -0,0 +1,300 @@
+import os
+import json
+import copy
+import random
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "20"))
+MOCK_JITTER_MS = float(os.getenv("MOCK_JITTER_MS", "5"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))  # share of data calls answered with 503
+MOCK_FIXTURES = os.getenv(
+    "MOCK_FIXTURES",
+    "../Approval_credit_APP-0001.json,../Approval_credit_APP-0002.json,../FIV-C_APP-0001.json,../FIV-C_APP-0002.json",
+)
+
+# 🏷️ Object key as it appears in a recorded hierarchy (lower-cased) → env var holding its form ID
+OBJECT_FORMS = {
+    "application__c": "FORM_APPLICATION",
+    "property__c": "FORM_PROPERTY",
+    "loan_applicant__c": "FORM_LOAN_APPLICANT",
+    "capability__c": "FORM_CAPABILITY",
+    "loan_details__c": "FORM_LOAN_DETAILS",
+    "contentversion": "FORM_CONTENT_VERSION",
+    "contentversion__c": "FORM_CONTENT_VERSION",
+    "cashflow__c": "FORM_CASHFLOW",
+    "character__c": "FORM_CHARACTER",
+    "property_owners__c": "FORM_PROPERTY_OWNERS",
+    "bureau_highmark__c": "FORM_BUREAU_HIGHMARK",
+    "commonobject__c": "FORM_COMMON_OBJECT",
+    "dedupe_detail__c": "FORM_DEDUPE_DETAIL",
+    "dedupe_details__c": "FORM_DEDUPE_DETAIL",
+    "deferral_document__c": "FORM_DEFERRAL_DOCUMENT",
+    "fee_creation__c": "FORM_FEE_CREATION",
+    "loan_lien_linking__c": "FORM_LOAN_LIEN_LINKING",
+    "receipt__c": "FORM_RECEIPT",
+    "reciept__c": "FORM_RECEIPT",
+    "sanction_condition__c": "FORM_SANCTION_CONDITION",
+    "topup__c": "FORM_TOPUP",
+    "tr_deviation__c": "FORM_TR_DEVIATION",
+    "revisit__c": "FORM_REVISIT",
+    "verification__c": "FORM_VERIFICATION",
+    "geo_location__c": "FORM_GEO_LOCATION",
+}
+
+# Parent object key (lower-cased) → API name of the foreign key its children carry
+FOREIGN_KEYS = {
+    "application__c": "Application__c",
+    "loan_applicant__c": "Loan_Applicant__c",
+    "property__c": "Property__c",
+    "character__c": "Character__c",
+    "capability__c": "Capability__c",
+    "cashflow__c": "Cashflow__c",
+    "bureau_highmark__c": "Bureau_Highmark__c",
+    "deferral_document__c": "Deferral_Document__c",
+    "verification__c": "Verification__c",
+}
+
+
+# ------------------ 🗄️ Record Store ------------------
+class MockGateway:
+    """
+    Replays recorded hierarchies as a flat gateway: each record is stored
+    under its form ID with the foreign keys implied by its position in the
+    recording (Application__c plus its direct parent), and
+    /incomming/configdata/{org}/{form}?Field=a,b answers like the real
+    filter (comma-separated or repeated values).
+
+    Latency, jitter and error rate apply to every data call; `calls` counts
+    them per form ID.
+    """
+
+    def __init__(self, latency_ms=MOCK_LATENCY_MS, jitter_ms=MOCK_JITTER_MS, error_rate=MOCK_ERROR_RATE, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.records = {}  # form_id → {fivestarId: record}
+        self.calls = {}
+        self.logins = 0
+        self.applications = []  # application Names, in seeding order
+
+    # 📥 Seeding
+    def load_fixture(self, path):
+        with open(path, encoding="utf-8") as f:
+            app = json.load(f)["data"]["getApplicationHierarchy"]["Application__c"]
+        self.add_application(app)
+        return app
+
+    def add_application(self, app):
+        app_id = app.get("fivestarId")
+        self._add("Application__c", app, {})
+        if app.get("Name") and app["Name"] not in self.applications:
+            self.applications.append(app["Name"])
+        for key, children in app.items():
+            if isinstance(children, list):
+                for child in children:
+                    self._add_tree(key, child, "application__c", app_id, app_id)
+
+    def _add_tree(self, object_key, rec, parent_key, parent_id, app_id):
+        rec_id = rec.get("fivestarId")
+        if not rec_id:
+            return  # empty-children stub from the recording
+        self._add(object_key, rec, {"Application__c": app_id, FOREIGN_KEYS.get(parent_key, parent_key): parent_id})
+        for key, children in rec.items():
+            if isinstance(children, list):
+                for child in children:
+                    self._add_tree(key, child, object_key.lower(), rec_id, app_id)
+
+    def _add(self, object_key, rec, foreign_keys):
+        form_id = self.form_id(object_key)
+        if not form_id or not rec.get("fivestarId"):
+            return
+        stored = self.records.setdefault(form_id, {}).setdefault(rec["fivestarId"], {})
+        stored.update({k: v for k, v in rec.items() if not isinstance(v, list)})
+        stored.update(foreign_keys)
+
+    @staticmethod
+    def form_id(object_key):
+        env_name = OBJECT_FORMS.get(object_key.lower())
+        return (os.getenv(env_name) or "").strip() or None if env_name else None
+
+    # 📈 Synthetic scaling
+    def add_scaled(self, app, applicants, properties, name=None):
+        """
+        Clone a recorded application with `applicants` loan applicants, each
+        owning `properties` properties (cloned from the recording's properties,
+        with the applicant's property owners under each one). Returns the name
+        of the synthetic application, or None if the recording has no real
+        applicant to clone.
+
+        Every clone gets an ID derived from `name` (pass a distinct name per
+        fixture), and foreign-key fields are relinked inside the clone: a
+        reference to an ancestor's original points at that ancestor's clone,
+        any other reference into the recordings is cleared, so lookups for
+        the recorded applications never return synthetic records.
+        """
+        template_applicants = [a for a in app.get("Loan_applicant__c") or [] if a.get("fivestarId")]
+        if not template_applicants:
+            return None
+        name = name or f"{app.get('Name')}-x{applicants}x{properties}"
+        counter = iter(range(1, 10 ** 9))
+        origins = {}  # clone ID → recorded ID
+        recorded_ids = {rec_id for records in self.records.values() for rec_id in records}
+        recorded_ids |= _ids(app)
+
+        def fresh(rec):
+            clone = copy.deepcopy(rec)
+            _renumber(clone, name, counter, origins)
+            return clone
+
+        template_properties = [p for p in app.get("Property__c") or [] if p.get("fivestarId")]
+        # Recorded properties only serve as templates for the applicants' properties
+        scaled = fresh({k: v for k, v in app.items() if k not in ("Loan_applicant__c", "Property__c")})
+        scaled["Name"] = name
+        scaled["Loan_applicant__c"] = []
+        for i in range(applicants):
+            applicant = fresh(template_applicants[i % len(template_applicants)])
+            owners = applicant.get("Property_owners__c") or []
+            applicant["Property__c"] = []
+            for j in range(properties if template_properties else 0):
+                prop = fresh({k: v for k, v in template_properties[j % len(template_properties)].items()
+                              if not isinstance(v, list)})
+                prop["Property_owners__c"] = [fresh(owner) for owner in owners]
+                applicant["Property__c"].append(prop)
+            scaled["Loan_applicant__c"].append(applicant)
+        _relink(scaled, recorded_ids, origins)
+        self.add_application(scaled)
+        return name
+
+    # 🌐 Request handling
+    async def delay(self):
+        latency = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    def query(self, form_id, filters):
+        self.calls[form_id] = self.calls.get(form_id, 0) + 1
+        records = self.records.get(form_id, {}).values()
+        for field, values in filters.items():
+            wanted = {v for value in values for v in value.split(",")}
+            records = [rec for rec in records if str(rec.get(field)) in wanted]
+        return list(records)
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def reset(self):
+        self.calls = {}
+        self.logins = 0
+
+
+def _renumber(rec, suffix, counter, origins):
+    if isinstance(rec, dict):
+        if rec.get("fivestarId"):
+            clone_id = f"{rec['fivestarId']}-{suffix}-{next(counter)}"
+            origins[clone_id] = rec["fivestarId"]
+            rec["fivestarId"] = clone_id
+        for value in rec.values():
+            if isinstance(value, list):
+                for child in value:
+                    _renumber(child, suffix, counter, origins)
+
+
+def _ids(rec):
+    ids = {rec["fivestarId"]} if isinstance(rec, dict) and rec.get("fivestarId") else set()
+    for value in rec.values() if isinstance(rec, dict) else ():
+        if isinstance(value, list):
+            for child in value:
+                ids |= _ids(child)
+    return ids
+
+
+def _relink(rec, recorded_ids, origins, lineage=None):
+    """Point a cloned subtree's foreign keys at its cloned ancestors; drop other references to recorded IDs."""
+    lineage = dict(lineage or {})  # recorded ID → clone ID, for this record's ancestors
+    if rec.get("fivestarId"):
+        lineage[origins.get(rec["fivestarId"])] = rec["fivestarId"]
+    for key, value in rec.items():
+        if key != "fivestarId" and isinstance(value, str) and value in recorded_ids:
+            rec[key] = lineage.get(value)
+    for value in rec.values():
+        if isinstance(value, list):
+            for child in value:
+                if isinstance(child, dict):
+                    _relink(child, recorded_ids, origins, lineage)
+
+
+def create_app(mock):
+    """FastAPI app serving the gateway data and login endpoints from `mock`."""
+    app = FastAPI(title="Mock gateway")
+    login_path = urlsplit(os.getenv("LOGIN_URL") or "").path or "/login"
+
+    @app.post(login_path)
+    async def login():
+        mock.logins += 1
+        await mock.delay()
+        return {"data": {"sessionId": f"mock-session-{mock.logins}"}}
+
+    @app.get("/incomming/configdata/{org_id}/{form_id}")
+    async def configdata(org_id: str, form_id: str, request: Request):
+        await mock.delay()
+        if mock.error_rate and mock.random.random() < mock.error_rate:
+            return JSONResponse({"error": "mock upstream failure"}, status_code=503)
+        filters = {}
+        for field, value in request.query_params.multi_items():
+            filters.setdefault(field, []).append(value)
+        return mock.query(form_id, filters)
+
+    @app.get("/mock/stats")
+    def stats():
+        return {"calls": mock.total_calls(), "by_form": mock.calls, "logins": mock.logins}
+
+    @app.post("/mock/reset")
+    def reset():
+        mock.reset()
+        return {"reset": True}
+
+    return app
+
+
+def seeded_mock(fixtures=MOCK_FIXTURES, scale=None, **options):
+    """MockGateway loaded with the recorded fixtures; `scale` = (applicants, properties) adds synthetic clones."""
+    mock = MockGateway(**options)
+    synthetic = []
+    paths = [p.strip() for p in fixtures.split(",") if p.strip()]
+    apps = [mock.load_fixture(path) for path in paths]
+    for path, app in zip(paths, apps if scale else ()):
+        # 🏷️ One synthetic application per fixture file (recordings of several stages share IDs)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = mock.add_scaled(app, *scale, name=f"{stem}-x{scale[0]}x{scale[1]}")
+        if name:
+            synthetic.append(name)
+    if synthetic:
+        print(f"🧪 Synthetic applications: {', '.join(synthetic)}")
+    return mock
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Replaying mock of the form gateway")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=MOCK_LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=MOCK_JITTER_MS)
+    parser.add_argument("--error-rate", type=float, default=MOCK_ERROR_RATE)
+    parser.add_argument("--scale", help="synthetic size as APPLICANTSxPROPERTIES, e.g. 20x10")
+    args = parser.parse_args()
+
+    scale = tuple(int(n) for n in args.scale.lower().split("x")) if args.scale else None
+    mock = seeded_mock(scale=scale, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate)
+    print(f"🧪 Point GATEWAY at http://127.0.0.1:{args.port} (and LOGIN_URL at the same host)")
+    uvicorn.run(create_app(mock), host="127.0.0.1", port=args.port)
@@ -0,0 +1,224 @@
+import os
+import time
+import asyncio
+from dotenv import load_dotenv
+from fastapi import APIRouter
+
+from gateway_client import fetch_applications_by_field
+from stages import STAGES
+from batch_runner import run_batch
+from upstream_governor import governor, priority
+from metrics import gateway_latency, register_collector
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes")
+PREFETCH_FIELD = os.getenv("PREFETCH_FIELD", "Stage__c")  # Application__c field that marks active applications
+PREFETCH_STAGES = [s.strip() for s in os.getenv("PREFETCH_STAGES", "Process Credit").split(",") if s.strip()]
+PREFETCH_PROFILES = [p.strip() for p in os.getenv("PREFETCH_PROFILES", ",".join(STAGES)).split(",") if p.strip()]
+PREFETCH_INTERVAL_SECONDS = float(os.getenv("PREFETCH_INTERVAL_SECONDS", "60"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))  # applications warmed at the same time
+PREFETCH_MAX_APPLICATIONS = int(os.getenv("PREFETCH_MAX_APPLICATIONS", "200"))  # per round
+PREFETCH_TARGET_LATENCY_MS = float(os.getenv("PREFETCH_TARGET_LATENCY_MS", "250"))  # back off above this
+PREFETCH_MAX_DELAY_SECONDS = float(os.getenv("PREFETCH_MAX_DELAY_SECONDS", "10"))  # pause between builds, at most
+
+PACING_STEP_SECONDS = 0.1  # first back-off step; doubled while the gateway stays slow or busy
+
+
+# ------------------ 🔥 Prefetcher ------------------
+class Prefetcher:
+    """
+    Keeps the hierarchies of active applications warm. Every `interval`
+    seconds (start to start) it lists the applications whose PREFETCH_FIELD
+    is one of PREFETCH_STAGES and rebuilds each of them for every profile in
+    PREFETCH_PROFILES, so the first user request for a hot application is
+    assembled from the response cache. A rebuild only fetches the records
+    that would expire before the next round or are inside their object's
+    refresh-ahead window (see response_cache); everything else is reused,
+    so each object keeps its own CACHE_TTLS.
+
+    Builds run on a small worker pool at the governor's "prefetch" priority
+    (behind interactive and batch calls) and are paced adaptively: while the
+    gateway's average latency is above PREFETCH_TARGET_LATENCY_MS, or
+    interactive calls are queueing, workers pause between builds for a delay
+    that doubles up to PREFETCH_MAX_DELAY_SECONDS, and halves back when the
+    gateway recovers.
+    """
+
+    def __init__(self, stages=None, profiles=None, interval=PREFETCH_INTERVAL_SECONDS, workers=PREFETCH_WORKERS):
+        self.field = PREFETCH_FIELD
+        self.stages = PREFETCH_STAGES if stages is None else stages
+        self.profiles = [name for name in (PREFETCH_PROFILES if profiles is None else profiles) if name in STAGES]
+        self.interval = interval
+        self.workers = workers
+        self.delay = 0.0
+        self.latency = None  # smoothed gateway latency (seconds) seen while prefetching
+        self._seen = gateway_latency.totals()
+        self._task = None
+        self._round = None
+        self.rounds = 0
+        self.warmed = {"ok": 0, "partial": 0, "not_found": 0, "error": 0}
+        self.last_round = None
+        self.last_error = None
+        self.next_round_at = None
+
+    # 🔁 Lifecycle
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            print(f"🔥 Prefetching {self.field} in {self.stages} every {self.interval:g}s for {self.profiles}")
+        return self._task
+
+    async def stop(self):
+        for task in (self._task, self._round):
+            if task is not None and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = None
+        self.next_round_at = None
+
+    @property
+    def running(self):
+        return self._round is not None and not self._round.done()
+
+    def trigger(self):
+        """Start a round now unless one is running; True if one was started."""
+        if self.running:
+            return False
+        self._round = asyncio.create_task(self.run_once())
+        return True
+
+    async def _loop(self):
+        while True:
+            started = time.time()
+            if not self.running:
+                self._round = asyncio.create_task(self.run_once())
+            await asyncio.gather(self._round, return_exceptions=True)
+            # ⏱️ Paced from round start: a slow round does not push the next one back
+            self.next_round_at = started + self.interval
+            await asyncio.sleep(max(0.0, self.next_round_at - time.time()))
+
+    # 🧵 One round
+    async def run_once(self):
+        """List the active applications and rebuild them all; returns the round summary."""
+        started = time.perf_counter()
+        summary = {"started_at": time.time(), "applications": 0, **{result: 0 for result in self.warmed}}
+        with priority("prefetch"):
+            try:
+                names = await self.discover()
+            except Exception as e:
+                print(f"⚠️ Prefetch listing failed: {e}")
+                self.last_error = str(e)
+                return summary
+            summary["applications"] = len(names)
+            async for item in run_batch(names, self._warm, workers=self.workers, priority_class="prefetch"):
+                result = item.get("data", "error")
+                if result == "error":
+                    self.last_error = f"{item['application_name']}: {item['error']}"
+                summary[result] += 1
+                self.warmed[result] += 1
+
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        self.rounds += 1
+        self.last_round = summary
+        print(f"🔥 Prefetch round: {summary}")
+        return summary
+
+    async def discover(self):
+        """Names of the applications to warm, in listing order, at most PREFETCH_MAX_APPLICATIONS."""
+        names = []
+        for value in self.stages:
+            for rec in await fetch_applications_by_field(self.field, value):
+                name = rec.get("Name") if isinstance(rec, dict) else None
+                if name and name not in names:
+                    names.append(name)
+        if len(names) > PREFETCH_MAX_APPLICATIONS:
+            print(f"⚠️ {len(names)} active applications, prefetching the first {PREFETCH_MAX_APPLICATIONS}")
+        return names[:PREFETCH_MAX_APPLICATIONS]
+
+    async def _warm(self, application_name):
+        """"ok" / "partial" once every profile is rebuilt, "not_found" if the application is gone."""
+        result = "ok"
+        for profile in self.profiles:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            data = await STAGES[profile].refresh(application_name, horizon=self.interval)
+            self._pace()
+            if data is None:
+                return "not_found"
+            result = "partial" if data.get("incomplete") or result == "partial" else "ok"
+        return result
+
+    # 🐢 Adaptive pacing
+    def _pace(self):
+        total, count = gateway_latency.totals()
+        calls = count - self._seen[1]
+        if calls:
+            window = (total - self._seen[0]) / calls
+            self.latency = window if self.latency is None else 0.7 * self.latency + 0.3 * window
+        self._seen = (total, count)
+
+        slow = self.latency is not None and self.latency * 1000 > PREFETCH_TARGET_LATENCY_MS
+        if slow or governor.depth("interactive"):
+            self.delay = min(PREFETCH_MAX_DELAY_SECONDS, max(self.delay * 2, PACING_STEP_SECONDS))
+        else:
+            self.delay = self.delay / 2 if self.delay / 2 >= PACING_STEP_SECONDS else 0.0
+
+    def stats(self):
+        return {
+            "enabled": self._task is not None and not self._task.done(),
+            "field": self.field,
+            "stages": self.stages,
+            "profiles": self.profiles,
+            "interval_seconds": self.interval,
+            "workers": self.workers,
+            "running": self.running,
+            "rounds": self.rounds,
+            "warmed": self.warmed,
+            "last_round": self.last_round,
+            "last_error": self.last_error,
+            "next_round_in_seconds": round(max(0.0, self.next_round_at - time.time()), 1)
+            if self.next_round_at and not self.running else None,
+            "pacing": {
+                "delay_seconds": round(self.delay, 3),
+                "gateway_latency_ms": round(self.latency * 1000, 3) if self.latency is not None else None,
+                "target_latency_ms": PREFETCH_TARGET_LATENCY_MS,
+            },
+        }
+
+
+# Started by the Strawberry server's lifespan when PREFETCH_ENABLED
+prefetcher = Prefetcher()
+
+
+@register_collector
+def _prefetch_metrics():
+    return {
+        "prefetch_rounds_total": ("Completed prefetch rounds", "counter", [({}, prefetcher.rounds)]),
+        "prefetch_applications_total": (
+            "Applications warmed by the prefetcher, by outcome", "counter",
+            [({"result": result}, count) for result, count in prefetcher.warmed.items()],
+        ),
+        "prefetch_running": ("1 while a prefetch round is in progress", "gauge", [({}, int(prefetcher.running))]),
+        "prefetch_pacing_delay_seconds": (
+            "Pause between prefetch builds chosen by adaptive pacing", "gauge", [({}, prefetcher.delay)],
+        ),
+    }
+
+
+# ------------------ 🛠️ Prefetch Routes ------------------
+router = APIRouter(prefix="/admin/prefetch", tags=["admin"])
+
+
+@router.get("")
+def prefetch_status():
+    """Prefetcher configuration, last round and current pacing."""
+    return prefetcher.stats()
+
+
+@router.post("/run")
+async def prefetch_run():
+    """Start a prefetch round now (also when the periodic prefetcher is disabled)."""
+    return {"started": prefetcher.trigger(), **prefetcher.stats()}
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from query_plan import compile_plan
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+PROFILE_MAX = int(os.getenv("PROFILE_MAX", "256"))  # compiled profiles kept in memory (LRU)
+
+
+# ------------------ 🗂️ Profile Registry ------------------
+def profile_id_for(relation_map, field_map):
+    """Content hash of a relation/field map pair; identical maps always get the same ID."""
+    canonical = json.dumps([relation_map, field_map], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class Profile:
+    def __init__(self, profile_id, relation_map, field_map, plan):
+        self.profile_id = profile_id
+        self.relation_map = relation_map
+        self.field_map = field_map
+        self.plan = plan
+        self.created_at = time.time()
+        self.uses = 0
+
+    def summary(self):
+        return {
+            "profile_id": self.profile_id,
+            "anchor": self.plan.root.object_name,
+            "nodes": sum(1 for _ in self.plan.nodes()),
+            "unresolved": list(self.plan.unresolved),
+            "uses": self.uses,
+            "created_at": self.created_at,
+        }
+
+
+class ProfileRegistry:
+    """
+    Compiled query plans keyed by the content hash of their relation/field
+    maps. Clients register a profile once and then send only its ID; requests
+    that still carry inline maps hit the same cache by hash, so a given pair
+    of maps is compiled once per process. IDs are content hashes, so after a
+    restart or eviction clients simply register again and get the same ID.
+    """
+
+    def __init__(self, form_to_object, max_profiles=PROFILE_MAX):
+        self.form_to_object = form_to_object
+        self.max_profiles = max_profiles
+        self._profiles = OrderedDict()
+
+    def register(self, relation_map, field_map):
+        """Compile (or reuse) the plan for these maps → (profile, created)."""
+        profile_id = profile_id_for(relation_map, field_map)
+        profile = self._profiles.get(profile_id)
+        if profile is not None:
+            self._profiles.move_to_end(profile_id)
+            return profile, False
+
+        plan = compile_plan(relation_map, self.form_to_object, field_map, name=f"profile {profile_id}")
+        profile = self._profiles[profile_id] = Profile(profile_id, relation_map, field_map, plan)
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+        print(f"🗂️ Registered profile {profile_id}")
+        return profile, True
+
+    def get(self, profile_id):
+        profile = self._profiles.get(profile_id)
+        if profile is not None:
+            self._profiles.move_to_end(profile_id)
+            profile.uses += 1
+        return profile
+
+    def remove(self, profile_id):
+        return self._profiles.pop(profile_id, None) is not None
+
+    def list(self):
+        return [profile.summary() for profile in self._profiles.values()]
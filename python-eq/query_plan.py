@@ -0,0 +1,181 @@
+import math
+import difflib
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Optional, Tuple
+
+from field_filter import FieldProjector, compile_field_map
+
+
+# ------------------ 🔠 Utility ------------------
+def to_api_name(name: str):
+    """Convert e.g. loan_applicant__c → Loan_applicant__c"""
+    if not name:
+        return name
+    parts = name.split("__c")
+    return parts[0].capitalize() + "__c"
+
+
+# ------------------ 🗺️ Plan Nodes ------------------
+@dataclass(frozen=True)
+class PlanNode:
+    """One RELATION_MAP node with everything resolved at startup."""
+
+    object_name: str
+    form_id: Optional[str]  # None → no form mapping, the node is never fetched
+    join_field: str  # parent object name, used as the gateway filter
+    output_key: str
+    projector: FieldProjector
+    children: Tuple["PlanNode", ...]
+    path: str
+
+    @property
+    def resolved(self):
+        return self.form_id is not None
+
+    def walk(self):
+        """Yield this node and every descendant (depth-first)."""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    root: PlanNode
+    unresolved: Tuple[str, ...]
+
+    def nodes(self):
+        """Every node below the anchor."""
+        for child in self.root.children:
+            yield from child.walk()
+
+    @cached_property
+    def form_objects(self):
+        """form ID → object name of every fetched node, as named in this plan's relation map."""
+        return {node.form_id: node.object_name for node in self.root.walk() if node.resolved}
+
+
+# ------------------ 🏗️ Compile ------------------
+def compile_plan(relation_map, form_to_object, field_map, projectors=None, name="plan", report=True):
+    """
+    Compile a RELATION_MAP into an immutable plan tree. Each node carries its
+    form ID, join field, output key and field projector, so traversal does no
+    map scans at request time. Nodes without a form mapping are reported once
+    here instead of silently returning nothing on every request.
+    """
+    projectors = projectors if projectors is not None else compile_field_map(field_map)
+    object_to_form = {obj: fid for fid, obj in form_to_object.items() if fid}
+    lowered_projectors = {}
+    for key, projector in projectors.items():
+        lowered_projectors.setdefault(key.lower(), projector)
+    unresolved = []
+
+    def build(object_name, parent_object, tree_node, parent_path):
+        path = f"{parent_path}/{object_name}" if parent_path else object_name
+        form_id = object_to_form.get(object_name)
+        if not form_id and parent_object:
+            unresolved.append(path)
+        children = tuple(
+            build(child_obj, object_name, child_tree, path)
+            for child_obj, child_tree in (tree_node or {}).items()
+        )
+        return PlanNode(
+            object_name=object_name,
+            form_id=form_id,
+            join_field=parent_object if parent_object else "Application__c",
+            output_key=to_api_name(object_name),
+            projector=lowered_projectors.get(object_name.lower()) or FieldProjector([]),
+            children=children,
+            path=path,
+        )
+
+    anchor = next(iter(relation_map))
+    root = build(anchor, None, relation_map[anchor], "")
+    plan = QueryPlan(root=root, unresolved=tuple(unresolved))
+
+    if report and unresolved:
+        known = list(object_to_form)
+        print(f"⚠️ [{name}] {len(unresolved)} relation node(s) have no form mapping and will stay empty:")
+        for path in unresolved:
+            object_name = path.rsplit("/", 1)[-1]
+            hint = difflib.get_close_matches(object_name, known, n=1, cutoff=0.6)
+            print(f"   • {path}" + (f" (did you mean {hint[0]}?)" if hint else ""))
+    return plan
+
+
+# ------------------ 📈 Fan-out Statistics ------------------
+class FanoutStats:
+    """
+    Observed records-per-parent for each plan path, globally and for the most
+    recently built applications. Used to estimate gateway calls in /explain.
+    """
+
+    MAX_APPLICATIONS = 512
+
+    def __init__(self):
+        self.totals = {}  # path → [parents, records]
+        self.by_application = OrderedDict()
+
+    def record(self, application_name, observed):
+        for path, (parents, records) in observed.items():
+            total = self.totals.setdefault(path, [0, 0])
+            total[0] += parents
+            total[1] += records
+        if application_name:
+            self.by_application[application_name] = {path: list(v) for path, v in observed.items()}
+            self.by_application.move_to_end(application_name)
+            while len(self.by_application) > self.MAX_APPLICATIONS:
+                self.by_application.popitem(last=False)
+
+    def fanout(self, path, application_name=None):
+        counts = self.by_application.get(application_name, {}).get(path) or self.totals.get(path)
+        if not counts or not counts[0]:
+            return 1.0, "default"
+        source = "application" if application_name in self.by_application else "average"
+        return counts[1] / counts[0], source
+
+
+fanout_stats = FanoutStats()
+
+
+# ------------------ 🔍 Explain ------------------
+def explain_plan(plan, application_name=None, chunk_size=50):
+    """
+    Describe the plan and estimate upstream calls per engine (before caching).
+    Record counts come from the last build of `application_name` when known,
+    otherwise from averages over all builds, otherwise one record per parent.
+    """
+    totals = {"concurrent": 1, "batched": 1, "bulk": 1}  # +1: Application__c lookup by Name
+    bulk_forms = set()
+
+    def describe(node, expected_parents):
+        fanout, source = fanout_stats.fanout(node.path, application_name)
+        expected_records = expected_parents * fanout if node.resolved else 0
+        if node.resolved:
+            totals["concurrent"] += math.ceil(expected_parents)
+            totals["batched"] += math.ceil(expected_parents / chunk_size) if expected_parents else 0
+            bulk_forms.add(node.form_id)
+        return {
+            "object": node.object_name,
+            "output_key": node.output_key,
+            "form_id": node.form_id,
+            "join_field": node.join_field,
+            "resolved": node.resolved,
+            "fields": len(node.projector.allowed_fields),
+            "estimated_parents": round(expected_parents, 2),
+            "estimated_records": round(expected_records, 2),
+            "fanout_source": source,
+            "children": [describe(child, expected_records) for child in node.children],
+        }
+
+    tree = [describe(child, 1.0) for child in plan.root.children]
+    totals["bulk"] += len(bulk_forms)
+    return {
+        "anchor": plan.root.object_name,
+        "application_name": application_name,
+        "unresolved": list(plan.unresolved),
+        "estimated_calls": totals,
+        "plan": tree,
+    }
@@ -0,0 +1,162 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+
+from hierarchy_engine import group_by_field
+from tracing import record_lookup
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+# Derive child record sets from an application-level superset instead of fetching them
+REQUEST_MEMO_DERIVE = os.getenv("REQUEST_MEMO_DERIVE", "true").lower() in ("1", "true", "yes")
+
+
+# ------------------ ♻️ Request Memo ------------------
+class RequestMemo:
+    """
+    Fetch memo and identity map for a single hierarchy build. Wraps the
+    fetch_children / fetch_children_batch pair handed to HierarchyContext:
+
+    - identical lookups (form, join field, parent ID) share one fetch, whether
+      still in flight or already completed
+    - once an object has been fetched for the whole application
+      (Application__c=<anchor_id>), lookups of the same object through another
+      join field are answered by filtering that superset on the foreign key,
+      provided the superset is non-empty and its records carry the key
+    - records seen through several join fields resolve to one dict per
+      (form, fivestarId)
+
+    Loads run as tasks of their own so that one cancelled caller does not
+    cancel a fetch others wait on; close() cancels whatever is still loading
+    once the build that owns the memo ends.
+
+    The wrapped fetchers receive the object name of each form ID as given in
+    `object_names` (the plan's form_objects), so one gateway form shared by
+    several profiles is logged, cached and invalidated under each one's name.
+
+    Counters: `fetches` calls reached the wrapped fetchers, `avoided` calls did
+    not; `coalesced` / `derived` count parent lookups answered from the memo.
+    """
+
+    def __init__(self, fetch_one, fetch_many, anchor_field="Application__c", anchor_id=None, derive=REQUEST_MEMO_DERIVE,
+                 object_names=None):
+        self.fetch_one = fetch_one
+        self.fetch_many = fetch_many
+        self.anchor_field = anchor_field.lower()
+        self.anchor_id = anchor_id
+        self.derive = derive
+        self.object_names = object_names or {}
+        self._lookups = {}  # (form_id, join_field, parent_id) → task resolving to {parent_id: records}
+        self._identity = {}
+        self._loads = set()  # load tasks still running
+        self.fetches = 0
+        self.avoided = 0
+        self.coalesced = 0
+        self.derived = 0
+
+    async def fetch_children(self, form_id, join_field, parent_id):
+        return (await self._resolve(form_id, join_field, [parent_id]))[parent_id]
+
+    async def fetch_children_batch(self, form_id, join_field, parent_ids):
+        resolved = await self._resolve(form_id, join_field, parent_ids)
+        return [rec for pid in dict.fromkeys(parent_ids) for rec in resolved[pid]]
+
+    def close(self):
+        """Cancel the loads still in flight (the build was cancelled or gave up)."""
+        for load in self._loads:
+            load.cancel()
+        self._loads.clear()
+
+    def stats(self):
+        return {
+            "fetches": self.fetches,
+            "avoided": self.avoided,
+            "coalesced": self.coalesced,
+            "derived": self.derived,
+            "records": len(self._identity),
+        }
+
+    async def _resolve(self, form_id, join_field, parent_ids):
+        field = join_field.lower()
+        tasks = {}
+        missing = []
+        for pid in dict.fromkeys(parent_ids):
+            task = self._lookups.get((form_id, field, pid))
+            if task is None:
+                missing.append(pid)
+            else:
+                self.coalesced += 1
+                tasks[pid] = task
+        if tasks:
+            record_lookup(form_id, join_field, list(tasks), "memo")
+
+        if missing:
+            load = asyncio.ensure_future(self._load(form_id, join_field, missing))
+            self._loads.add(load)
+            load.add_done_callback(self._loads.discard)
+            for pid in missing:
+                key = (form_id, field, pid)
+                self._lookups[key] = tasks[pid] = load
+            load.add_done_callback(lambda t, keys=[(form_id, field, pid) for pid in missing]: self._forget_failed(t, keys))
+        else:
+            self.avoided += 1
+
+        resolved = {}
+        for task in set(tasks.values()):
+            # 🛡️ One caller being cancelled must not cancel a fetch other lookups are waiting on
+            resolved.update(await asyncio.shield(task))
+        return {pid: resolved.get(pid, []) for pid in tasks}
+
+    async def _load(self, form_id, join_field, parent_ids):
+        derived = await self._derive(form_id, join_field, parent_ids)
+        if derived is not None:
+            self.avoided += 1
+            self.derived += len(parent_ids)
+            record_lookup(form_id, join_field, parent_ids, "derived")
+            return derived
+
+        self.fetches += 1
+        object_name = self.object_names.get(form_id)
+        if len(parent_ids) == 1:
+            data = await self.fetch_one(form_id, join_field, parent_ids[0], object_name)
+            grouped = {parent_ids[0]: data or []}
+        else:
+            grouped = group_by_field(await self.fetch_many(form_id, join_field, parent_ids, object_name), join_field)
+        return {pid: self._canonical(form_id, grouped.get(pid, [])) for pid in parent_ids}
+
+    async def _derive(self, form_id, join_field, parent_ids):
+        """Filter the application-level record set of `form_id` on `join_field`, if that is safe."""
+        if not self.derive or not self.anchor_id or join_field.lower() == self.anchor_field:
+            return None
+        superset = self._lookups.get((form_id, self.anchor_field, self.anchor_id))
+        if superset is None:
+            return None
+        try:
+            records = (await asyncio.shield(superset)).get(self.anchor_id) or []
+        except Exception:
+            return None
+
+        lowered = join_field.lower()
+        if not records or not all(any(k.lower() == lowered for k in rec) for rec in records):
+            return None
+        grouped = group_by_field(records, join_field)
+        return {pid: grouped.get(pid, []) for pid in parent_ids}
+
+    def _canonical(self, form_id, records):
+        canonical = []
+        for rec in records:
+            rec_id = rec.get("fivestarId") or rec.get("Id") if isinstance(rec, dict) else None
+            if rec_id is None:
+                canonical.append(rec)
+            else:
+                canonical.append(self._identity.setdefault((form_id, rec_id), rec))
+        return canonical
+
+    def _forget_failed(self, task, keys):
+        # ❌ Failed fetches are not memoized: a later lookup retries
+        if task.cancelled() or task.exception() is not None:
+            for key in keys:
+                if self._lookups.get(key) is task:
+                    del self._lookups[key]
@@ -0,0 +1,261 @@
+import os
+import time
+import random
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+import httpx
+from dotenv import load_dotenv
+
+from metrics import gateway_retries, gateway_hedges, gateway_rejected, register_collector
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+HIERARCHY_DEADLINE_SECONDS = float(os.getenv("HIERARCHY_DEADLINE_SECONDS", "25"))  # 0 → no deadline
+GATEWAY_RETRIES = int(os.getenv("GATEWAY_RETRIES", "2"))  # extra attempts for idempotent GETs
+GATEWAY_RETRY_BACKOFF_MS = float(os.getenv("GATEWAY_RETRY_BACKOFF_MS", "100"))  # doubled per attempt, ±50% jitter
+GATEWAY_HEDGE_AFTER_MS = float(os.getenv("GATEWAY_HEDGE_AFTER_MS", "0"))  # 0 → no hedged requests
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))  # consecutive failures that open a form's circuit
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))  # open → one trial call after this
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# Absolute time.monotonic() by which the current hierarchy build must finish (None → unbounded)
+current_deadline = ContextVar("current_deadline", default=None)
+
+
+# ------------------ ❌ Errors ------------------
+class UpstreamUnavailable(Exception):
+    """
+    A gateway lookup gave up: retries exhausted, circuit open, deadline spent,
+    or an answer that is not usable data (non-2xx status, invalid JSON).
+    """
+
+    reason = "unavailable"
+
+    def __init__(self, message="", reason=None):
+        super().__init__(message)
+        if reason is not None:
+            self.reason = reason
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    reason = "deadline"
+
+
+class CircuitOpen(UpstreamUnavailable):
+    reason = "circuit_open"
+
+
+class RetryableStatus(Exception):
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+
+# ------------------ ⏱️ Deadlines ------------------
+@contextmanager
+def deadline_scope(seconds=HIERARCHY_DEADLINE_SECONDS, at=None):
+    """
+    Bound every upstream call made inside (and in tasks started inside) to `seconds`
+    from now, or to the time.monotonic() value `at` (a deadline started earlier).
+    """
+    if at is None:
+        at = time.monotonic() + seconds if seconds and seconds > 0 else None
+    token = current_deadline.set(at)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+def start_deadline(seconds=HIERARCHY_DEADLINE_SECONDS):
+    """deadline_scope for async generators: set without reset (a generator may be finalized in another context)."""
+    current_deadline.set(time.monotonic() + seconds if seconds and seconds > 0 else None)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None without one."""
+    deadline = current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+# ------------------ 🔌 Circuit Breaker ------------------
+class CircuitBreaker:
+    """
+    Per form ID: after `failures` consecutive failed calls the circuit opens
+    and calls fail fast; after `reset_seconds` one trial call is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial:
+            self.trial = True
+            return True
+        return False
+
+    def success(self):
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial = False
+
+    def failure(self):
+        self.consecutive += 1
+        if self.trial or (self.failures and self.consecutive >= self.failures):
+            self.opened_at = time.monotonic()
+        self.trial = False
+
+
+breakers = {}
+
+
+def breaker_for(key):
+    breaker = breakers.get(key)
+    if breaker is None:
+        breaker = breakers[key] = CircuitBreaker()
+    return breaker
+
+
+def breaker_states():
+    return {key: {"state": b.state, "consecutive_failures": b.consecutive} for key, b in breakers.items()}
+
+
+@register_collector
+def _breaker_metrics():
+    states = ("closed", "half_open", "open")
+    return {
+        "gateway_circuit_state": (
+            "Circuit breaker state per form (1 for the current state)", "gauge",
+            [({"form": key, "state": state}, 1 if b.state == state else 0) for key, b in breakers.items() for state in states],
+        ),
+    }
+
+
+# ------------------ 🔁 Call Policy ------------------
+async def call_upstream(key, attempt, object_name=None, timeout=None):
+    """
+    Run `attempt(timeout)` (an idempotent gateway GET returning a response)
+    under the breaker of `key`, the current deadline, jittered retries on
+    transport errors / 429 / 5xx and, with GATEWAY_HEDGE_AFTER_MS, a hedged
+    duplicate when the first attempt is slow. `timeout` is the per-call
+    ceiling; each attempt gets min(timeout, time left).
+    Raises UpstreamUnavailable when the call cannot succeed in time.
+    """
+    object_name = object_name or "unknown"
+    breaker = breaker_for(key)
+    if not breaker.allow():
+        gateway_rejected.inc(object=object_name, reason="circuit_open")
+        raise CircuitOpen(f"Circuit open for {object_name} ({key})")
+
+    # Settled on every exit: "success" / "failure" feed the breaker; anything else
+    # (cancelled, deadline spent before calling) only ends a half-open trial, so
+    # the circuit never stays shut waiting for a trial that is gone.
+    outcome = None
+    try:
+        last_error = None
+        for attempt_no in range(GATEWAY_RETRIES + 1):
+            budget = _budget(timeout)
+            if budget is not None and budget <= 0:
+                gateway_rejected.inc(object=object_name, reason="deadline")
+                raise DeadlineExceeded(f"Deadline spent before calling {object_name}") from last_error
+            try:
+                res = await asyncio.wait_for(_hedged(attempt, budget, object_name), budget)
+                outcome = "success"
+                return res
+            except asyncio.TimeoutError as e:
+                last_error, reason = e, "timeout"
+            except RetryableStatus as e:
+                last_error, reason = e, str(e.response.status_code)
+            except Exception as e:
+                if not _is_transport_error(e):
+                    outcome = "failure"  # not retried (bad request, bug in the call), still a failed call
+                    raise
+                last_error, reason = e, type(e).__name__
+
+            if attempt_no == GATEWAY_RETRIES:
+                break
+            backoff = GATEWAY_RETRY_BACKOFF_MS / 1000 * (2 ** attempt_no) * random.uniform(0.5, 1.5)
+            left = remaining()
+            if left is not None and left <= backoff:
+                break
+            gateway_retries.inc(object=object_name, reason=reason)
+            print(f"🔁 Retrying {object_name} after {reason} ({attempt_no + 1}/{GATEWAY_RETRIES})")
+            await asyncio.sleep(backoff)
+
+        outcome = "failure"  # calls cut short by the deadline count too: a hung form trips its circuit
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded calling {object_name}") from last_error
+        if isinstance(last_error, RetryableStatus):
+            raise UpstreamUnavailable(f"{object_name}: gateway answered {last_error}") from last_error
+        raise UpstreamUnavailable(f"{object_name}: {type(last_error).__name__} {last_error}".strip()) from last_error
+    finally:
+        if outcome == "success":
+            breaker.success()
+        elif outcome == "failure":
+            breaker.failure()
+        else:
+            breaker.trial = False
+
+
+def _budget(timeout):
+    left = remaining()
+    if left is None:
+        return timeout
+    return left if timeout is None else min(timeout, left)
+
+
+async def _hedged(attempt, budget, object_name):
+    """One attempt, plus a duplicate if the first has not answered within GATEWAY_HEDGE_AFTER_MS."""
+    hedge_after = GATEWAY_HEDGE_AFTER_MS / 1000
+    if hedge_after <= 0 or (budget is not None and budget <= hedge_after):
+        return _checked(await attempt(budget))
+
+    first = asyncio.ensure_future(attempt(budget))
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        if done:
+            return _checked(first.result())
+
+        second = asyncio.ensure_future(attempt(None if budget is None else budget - hedge_after))
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result().status_code not in RETRY_STATUSES:
+                    gateway_hedges.inc(object=object_name, winner="hedge" if task is second else "original")
+                    return task.result()
+        return _checked(first.result())  # both failed: surface the original's outcome
+    finally:
+        # Cancelled or timed out while waiting: no attempt outlives the call (slot, connection)
+        for task in pending:
+            task.cancel()
+
+
+def _checked(res):
+    if res.status_code in RETRY_STATUSES:
+        raise RetryableStatus(res)
+    return res
+
+
+def _is_transport_error(error):
+    return isinstance(error, (httpx.TransportError, httpx.TimeoutException))
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+from metrics import register_collector
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# ⏱️ Per-object TTLs (seconds); CACHE_TTLS='{"Topup__c": 120}' overrides/extends these
+CACHE_TTLS = {
+    "Application__c": 30,
+    "Bureau_Highmark__c": 3600,
+    "Deferral_Document__c": 15,
+    **json.loads(os.getenv("CACHE_TTLS", "{}")),
+}
+
+# 🔄 Refresh-ahead window: background refreshers renew an entry only once it is
+# this close to expiry — a fraction of its TTL, or CACHE_REFRESH_AHEAD_SECONDS='{"Bureau_Highmark__c": 600}'
+CACHE_REFRESH_AHEAD = float(os.getenv("CACHE_REFRESH_AHEAD", "0.2"))
+CACHE_REFRESH_AHEAD_SECONDS = json.loads(os.getenv("CACHE_REFRESH_AHEAD_SECONDS", "{}"))
+
+# Application fivestarId of the hierarchy being built; entries are tagged with
+# it so that a write upstream can purge everything fetched for that application.
+current_application = ContextVar("current_application", default=None)
+
+# Set by background refreshers (prefetch) to the seconds until their next pass:
+# entries that would expire before then, or are inside their refresh-ahead
+# window, are fetched again and overwritten; all others are served as usual.
+cache_refresh = ContextVar("cache_refresh", default=None)
+
+
+# ------------------ 🗃️ Response Cache ------------------
+class ResponseCache:
+    """
+    Bounded in-process cache of raw gateway record lists.
+    - per-object TTLs (falling back to `default_ttl`)
+    - LRU eviction by entry count and by approximate JSON size in bytes
+    - hit/miss counters per object type
+    - invalidation by application ID or object type
+    - refresh-ahead for background refreshers (see `cache_refresh`)
+
+    Cached lists are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                 default_ttl=CACHE_DEFAULT_TTL, ttls=None, enabled=CACHE_ENABLED,
+                 refresh_ahead=CACHE_REFRESH_AHEAD, refresh_ahead_seconds=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self.enabled = enabled
+        self.refresh_ahead = refresh_ahead
+        self.refresh_ahead_seconds = CACHE_REFRESH_AHEAD_SECONDS if refresh_ahead_seconds is None else refresh_ahead_seconds
+        self._entries = OrderedDict()  # key → (value, expires_at, size, object_name, app_ids)
+        self._by_app = {}
+        self._by_object = {}
+        self.bytes = 0
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+        self.refreshes = 0
+
+    def get(self, key, object_name=None):
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is None or entry[1] <= now:
+            if entry is not None:
+                self._remove(key)
+            self.misses[object_name] = self.misses.get(object_name, 0) + 1
+            return None
+        horizon = cache_refresh.get()
+        if horizon is not None and entry[1] - now <= max(horizon, self.refresh_window(object_name)):
+            self.refreshes += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits[object_name] = self.hits.get(object_name, 0) + 1
+        return entry[0]
+
+    def refresh_window(self, object_name):
+        """Seconds before expiry from which a background refresh renews an entry of `object_name`."""
+        if object_name in self.refresh_ahead_seconds:
+            return self.refresh_ahead_seconds[object_name]
+        return self.refresh_ahead * self.ttls.get(object_name, self.default_ttl)
+
+    def put(self, key, value, object_name=None, app_ids=()):
+        if not self.enabled:
+            return
+        ttl = self.ttls.get(object_name, self.default_ttl)
+        if ttl <= 0:
+            return
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+
+        app_ids = {app_id for app_id in app_ids if app_id}
+        if key in self._entries:
+            app_ids |= self._entries[key][4]
+            self._remove(key)
+
+        self._entries[key] = (value, time.monotonic() + ttl, size, object_name, app_ids)
+        self.bytes += size
+        for app_id in app_ids:
+            self._by_app.setdefault(app_id, set()).add(key)
+        self._by_object.setdefault(object_name, set()).add(key)
+
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, application_id=None, object_type=None):
+        """Drop entries tagged with `application_id` and/or of `object_type`; returns the count removed."""
+        keys = set()
+        if application_id:
+            keys |= self._by_app.get(application_id, set())
+        if object_type:
+            keys |= {
+                key for obj, obj_keys in self._by_object.items()
+                if obj and obj.lower() == object_type.lower() for key in obj_keys
+            }
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        removed = len(self._entries)
+        self._entries.clear()
+        self._by_app.clear()
+        self._by_object.clear()
+        self.bytes = 0
+        return removed
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "refreshes": self.refreshes,
+            "hits": sum(self.hits.values()),
+            "misses": sum(self.misses.values()),
+            "by_object": {
+                str(obj): {"hits": self.hits.get(obj, 0), "misses": self.misses.get(obj, 0)}
+                for obj in set(self.hits) | set(self.misses)
+            },
+        }
+
+    def _remove(self, key):
+        value, _, size, object_name, app_ids = self._entries.pop(key)
+        self.bytes -= size
+        for app_id in app_ids:
+            keys = self._by_app.get(app_id)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_app[app_id]
+        keys = self._by_object.get(object_name)
+        if keys:
+            keys.discard(key)
+
+
+response_cache = ResponseCache()
+
+
+@register_collector
+def _cache_metrics():
+    stats = response_cache.stats()
+    by_object = stats["by_object"].items()
+    return {
+        "response_cache_entries": ("Cached gateway responses", "gauge", [({}, stats["entries"])]),
+        "response_cache_bytes": ("Approximate size of cached responses", "gauge", [({}, stats["bytes"])]),
+        "response_cache_evictions_total": ("LRU evictions", "counter", [({}, stats["evictions"])]),
+        "response_cache_refreshes_total": (
+            "Entries renewed ahead of expiry by background refreshes", "counter", [({}, stats["refreshes"])],
+        ),
+        "response_cache_hits_total": (
+            "Cache hits per object", "counter", [({"object": obj}, v["hits"]) for obj, v in by_object],
+        ),
+        "response_cache_misses_total": (
+            "Cache misses per object", "counter", [({"object": obj}, v["misses"]) for obj, v in by_object],
+        ),
+    }
@@ -0,0 +1,67 @@
+import os
+import asyncio
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "900"))
+SESSION_REFRESH_MARGIN_SECONDS = float(os.getenv("SESSION_REFRESH_MARGIN_SECONDS", "60"))
+
+
+# ------------------ 🗝️ Session Manager ------------------
+class SessionManager:
+    """
+    Caches the gateway session ID for `ttl` seconds.
+    - Within `refresh_margin` of expiry the cached ID is still served while a
+      refresh runs in the background.
+    - Concurrent callers share a single in-flight login (single-flight).
+    - invalidate() drops an ID the gateway rejected so the next get() logs in again.
+
+    `login` is an async callable returning a fresh session ID (see gateway_client.login).
+    """
+
+    def __init__(self, login, ttl=SESSION_TTL_SECONDS, refresh_margin=SESSION_REFRESH_MARGIN_SECONDS):
+        self._login = login
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl)
+        self._session_id = None
+        self._expires_at = 0.0
+        self._inflight = None
+        self.logins = 0
+
+    async def get(self):
+        now = time.monotonic()
+        if self._session_id and now < self._expires_at - self.refresh_margin:
+            return self._session_id
+        if self._session_id and now < self._expires_at:
+            # ⏳ About to expire: refresh proactively, keep serving the current ID
+            self._start_login()
+            return self._session_id
+        return await asyncio.shield(self._start_login())
+
+    def invalidate(self, session_id=None):
+        """Forget the cached session (only if it is still `session_id`, so a burst of 401s logs in once)."""
+        if session_id is None or session_id == self._session_id:
+            self._session_id = None
+            self._expires_at = 0.0
+
+    def _start_login(self):
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._refresh())
+            self._inflight.add_done_callback(_log_login_failure)
+        return self._inflight
+
+    async def _refresh(self):
+        session_id = await self._login()
+        self._session_id = session_id
+        self._expires_at = time.monotonic() + self.ttl
+        self.logins += 1
+        return session_id
+
+
+def _log_login_failure(task):
+    if not task.cancelled() and task.exception():
+        print(f"❌ Gateway login failed: {task.exception()}")
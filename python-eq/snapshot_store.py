@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+from tracing import current_trace
+from resilience import current_deadline
+from upstream_governor import current_priority
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "")  # e.g. ./snapshots.db; empty → snapshots disabled
+SNAPSHOT_FRESH_SECONDS = float(os.getenv("SNAPSHOT_FRESH_SECONDS", "60"))  # served without a refresh
+SNAPSHOT_MAX_STALE_SECONDS = float(os.getenv("SNAPSHOT_MAX_STALE_SECONDS", "86400"))  # older → ignored
+
+# Set inside background refreshes so their lookups go upstream instead of
+# being answered by the snapshot they are meant to replace.
+snapshot_bypass = ContextVar("snapshot_bypass", default=False)
+
+
+# ------------------ 💾 Snapshot Store ------------------
+class SnapshotStore:
+    """
+    SQLite-backed copy of gateway record sets and assembled hierarchies that
+    survives restarts, with stale-while-revalidate reads:
+    - age ≤ fresh_seconds: served as is
+    - age ≤ max_stale_seconds: served immediately, refreshed in the background
+    - older: ignored (the caller fetches synchronously)
+
+    Record sets are keyed like the response cache (form, field, value) and
+    tagged with the application ID; hierarchies by stage profile + application.
+
+    All SQLite and JSON work runs on one dedicated thread that owns the
+    connection, never on the event loop: reads are awaited, writes are queued
+    (fire-and-forget, applied in submission order, so a later read sees them).
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, fresh_seconds=SNAPSHOT_FRESH_SECONDS,
+                 max_stale_seconds=SNAPSHOT_MAX_STALE_SECONDS):
+        self.path = path
+        self.fresh_seconds = fresh_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self._db = None
+        self._thread = None
+        self._refreshing = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _run(self, fn, *args):
+        """Await `fn(*args)` on the store's thread."""
+        return asyncio.get_running_loop().run_in_executor(self._worker(), fn, *args)
+
+    def _submit(self, fn, *args):
+        """Queue `fn(*args)` on the store's thread without waiting for it."""
+        self._worker().submit(self._logged, fn, *args)
+
+    def _worker(self):
+        if self._thread is None:
+            self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-store")
+        return self._thread
+
+    @staticmethod
+    def _logged(fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"⚠️ Snapshot write failed: {e}")
+
+    async def flush(self):
+        """Wait until every queued write has been applied."""
+        if self.enabled:
+            await self._run(lambda: None)
+
+    def _conn(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " key TEXT PRIMARY KEY, object TEXT, app_id TEXT, fetched_at REAL, body TEXT)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS hierarchies ("
+                " profile TEXT, application_name TEXT, app_id TEXT, fetched_at REAL, body TEXT,"
+                " PRIMARY KEY (profile, application_name))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS records_app ON records (app_id)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS hierarchies_app ON hierarchies (app_id)")
+            print(f"💾 Snapshot store: {self.path}")
+        return self._db
+
+    # 📖 Reads
+    async def get_records(self, key):
+        """(records, stale) or None when there is no usable snapshot."""
+        if not self.enabled or snapshot_bypass.get():
+            return None
+        return (await self.get_records_many([key])).get(key)
+
+    async def get_records_many(self, keys):
+        """{key: (records, stale)} for the keys that have a usable snapshot, in one trip to the store thread."""
+        if not self.enabled or snapshot_bypass.get() or not keys:
+            return {}
+        rows = await self._run(self._select_records, list(keys))
+        found = {}
+        for key, row in zip(keys, rows):
+            snapshot = self._count(row)
+            if snapshot is not None:
+                found[key] = snapshot
+        return found
+
+    async def get_hierarchy(self, profile, application_name):
+        if not self.enabled or snapshot_bypass.get():
+            return None
+        return self._count(await self._run(self._select_hierarchy, profile, application_name))
+
+    def _select_records(self, keys):
+        db = self._conn()
+        return [
+            self._decode(db.execute("SELECT fetched_at, body FROM records WHERE key = ?", (_key(key),)).fetchone())
+            for key in keys
+        ]
+
+    def _select_hierarchy(self, profile, application_name):
+        return self._decode(self._conn().execute(
+            "SELECT fetched_at, body FROM hierarchies WHERE profile = ? AND application_name = ?",
+            (profile, application_name),
+        ).fetchone())
+
+    def _decode(self, row):
+        """(age, data), or None when missing or too old to serve (runs on the store thread)."""
+        age = time.time() - row[0] if row else None
+        if row is None or age > self.max_stale_seconds:
+            return None
+        return age, json.loads(row[1])
+
+    def _count(self, decoded):
+        if decoded is None:
+            self.misses += 1
+            return None
+        age, data = decoded
+        stale = age > self.fresh_seconds
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return data, stale
+
+    # ✍️ Writes (queued)
+    def put_records(self, key, records, object_name=None, app_id=None):
+        self.put_records_many([(key, records)], object_name, app_id)
+
+    def put_records_many(self, items, object_name=None, app_id=None):
+        """Store several (key, records) pairs of one object type in a single transaction."""
+        if not self.enabled or not items:
+            return
+        self._submit(self._write_records, list(items), object_name, app_id, time.time())
+
+    def put_hierarchy(self, profile, application_name, hierarchy, app_id=None):
+        if not self.enabled:
+            return
+        self._submit(self._write_hierarchy, profile, application_name, hierarchy, app_id, time.time())
+
+    def _write_records(self, items, object_name, app_id, fetched_at):
+        db = self._conn()
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO records (key, object, app_id, fetched_at, body) VALUES (?, ?, ?, ?, ?)",
+                [(_key(key), object_name, app_id, fetched_at, json.dumps(records, default=str))
+                 for key, records in items],
+            )
+
+    def _write_hierarchy(self, profile, application_name, hierarchy, app_id, fetched_at):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO hierarchies (profile, application_name, app_id, fetched_at, body)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (profile, application_name, app_id, fetched_at, json.dumps(hierarchy, default=str)),
+        )
+
+    async def invalidate(self, application_id=None, object_type=None):
+        """Drop snapshots of an application (fivestarId) and/or object type; returns the count removed."""
+        if not self.enabled:
+            return 0
+        return await self._run(self._delete, application_id, object_type)
+
+    def _delete(self, application_id, object_type):
+        db = self._conn()
+        removed = 0
+        if application_id:
+            removed += db.execute("DELETE FROM records WHERE app_id = ?", (application_id,)).rowcount
+            removed += db.execute("DELETE FROM hierarchies WHERE app_id = ?", (application_id,)).rowcount
+        if object_type:
+            removed += db.execute("DELETE FROM records WHERE lower(object) = lower(?)", (object_type,)).rowcount
+        return removed
+
+    async def clear(self):
+        if not self.enabled:
+            return 0
+        return await self._run(self._delete_all)
+
+    def _delete_all(self):
+        db = self._conn()
+        return db.execute("DELETE FROM records").rowcount + db.execute("DELETE FROM hierarchies").rowcount
+
+    # 🔄 Revalidation
+    def refresh_later(self, key, refresh):
+        """Run `refresh()` (a coroutine function) in the background, at most once per key at a time."""
+        task = self._refreshing.get(key)
+        if task is not None and not task.done():
+            return task
+
+        async def run():
+            snapshot_bypass.set(True)
+            current_trace.set(None)  # the request that triggered it may have finished
+            current_deadline.set(None)
+            current_priority.set("prefetch")
+            try:
+                await refresh()
+                self.refreshes += 1
+            except Exception as e:
+                print(f"⚠️ Snapshot refresh failed for {key}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        task = self._refreshing[key] = asyncio.ensure_future(run())
+        return task
+
+    async def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        records, hierarchies = await self._run(self._counts)
+        return {
+            "enabled": True,
+            "path": self.path,
+            "records": records,
+            "hierarchies": hierarchies,
+            "fresh_hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "background_refreshes": self.refreshes,
+            "refreshing": len(self._refreshing),
+        }
+
+    def _counts(self):
+        db = self._conn()
+        return (db.execute("SELECT COUNT(*) FROM records").fetchone()[0],
+                db.execute("SELECT COUNT(*) FROM hierarchies").fetchone()[0])
+
+
+def _key(key):
+    return json.dumps(key, default=str)
+
+
+snapshot_store = SnapshotStore()
@@ -0,0 +1,312 @@
+import os
+import time
+from dotenv import load_dotenv
+
+from field_filter import load_field_map_from_json, compile_field_map
+from gateway_client import fetch_by_parent_field, fetch_by_parent_ids, fetch_application_by_name
+from response_cache import current_application, cache_refresh
+from hierarchy_engine import HierarchyContext, build_hierarchy, stream_hierarchy
+from query_plan import compile_plan, fanout_stats
+from request_memo import RequestMemo
+from profile_registry import profile_id_for
+from snapshot_store import snapshot_store, snapshot_bypass
+from resilience import deadline_scope, start_deadline, HIERARCHY_DEADLINE_SECONDS
+from coalescing import coalescer
+from metrics import observe_build, hierarchy_in_flight
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+HIERARCHY_MODE = os.getenv("HIERARCHY_MODE", "concurrent")  # concurrent | batched | bulk
+
+
+# ------------------ 🎭 Stage Profile ------------------
+class Stage:
+    """
+    One screen/stage served by the Strawberry app: its form → object map,
+    RELATION_MAP and field map, compiled once at startup. Every stage shares
+    the gateway session, connection pool and response cache, so objects
+    common to several stages are fetched once.
+    """
+
+    def __init__(self, name, form_to_object, relation_map, field_map_path, type_prefix=""):
+        self.name = name
+        self.form_to_object = form_to_object
+        self.relation_map = relation_map
+        self.type_prefix = type_prefix  # keeps generated GraphQL type names unique across stages
+
+        self.field_map = load_field_map_from_json(field_map_path)
+        self.field_projectors = compile_field_map(self.field_map)
+        self.plan = compile_plan(relation_map, form_to_object, self.field_map, self.field_projectors, name=name)
+        # 💾 Snapshot key: a changed relation or field map never serves an old shape
+        self.profile_key = f"{name}:{profile_id_for(relation_map, self.field_map)}"
+
+    def _context(self, app_id, mode):
+        # ♻️ Overlapping lookups within this build share one fetch
+        memo = RequestMemo(fetch_by_parent_field, fetch_by_parent_ids, self.plan.root.object_name, app_id,
+                           object_names=self.plan.form_objects)
+        ctx = HierarchyContext(
+            memo.fetch_children,
+            fetch_children_batch=memo.fetch_children_batch,
+            mode=mode or HIERARCHY_MODE,
+        )
+        return memo, ctx
+
+    async def build(self, application_name, mode=None, fetch_stats=None):
+        """
+        Full hierarchy of one application, or None if no application has this name.
+        Pass a dict as `fetch_stats` to receive the request memo counters.
+        Subtrees that cannot be fetched within HIERARCHY_DEADLINE_SECONDS are left
+        out and listed under "errors", with "incomplete": true.
+        With snapshots enabled, a stored hierarchy is returned straight away
+        (and rebuilt in the background once stale). Concurrent calls for the
+        same application share one build and its (read-only) result.
+        """
+        snapshot = await snapshot_store.get_hierarchy(self.profile_key, application_name)
+        if snapshot is not None:
+            hierarchy, stale = snapshot
+            if stale:
+                snapshot_store.refresh_later(
+                    (self.profile_key, application_name), lambda: self._build(application_name, mode)
+                )
+            if fetch_stats is not None:
+                fetch_stats.update({"fetches": 0, "snapshot": "stale" if stale else "fresh"})
+            return hierarchy
+
+        key = (self.profile_key, application_name)
+        if fetch_stats is not None and coalescer.joining(key):
+            fetch_stats.update({"fetches": 0, "avoided": 0, "joined_build": True})
+        return await coalescer.run(key, lambda: self._build(application_name, mode, fetch_stats))
+
+    async def refresh(self, application_name, mode=None, fetch_stats=None, horizon=0.0):
+        """
+        build() for background prefetch, replacing the snapshot. Cached records
+        are fetched again only if they expire within `horizon` seconds (the time
+        until the next refresh) or are inside their refresh-ahead window; the
+        rest come from the cache. Not coalesced: requests arriving in the
+        meantime keep being served from the entries being replaced.
+        """
+        cache_token = cache_refresh.set(horizon)
+        snapshot_token = snapshot_bypass.set(True)
+        try:
+            return await self._build(application_name, mode, fetch_stats)
+        finally:
+            snapshot_bypass.reset(snapshot_token)
+            cache_refresh.reset(cache_token)
+
+    async def _build(self, application_name, mode=None, fetch_stats=None):
+        with deadline_scope(HIERARCHY_DEADLINE_SECONDS):
+            return await self._build_within_deadline(application_name, mode, fetch_stats)
+
+    async def _build_within_deadline(self, application_name, mode, fetch_stats):
+        app_data = await fetch_application_by_name(application_name)
+        if not app_data:
+            return None
+
+        app_record = app_data[0]
+        app_id = app_record.get("fivestarId")
+        current_application.set(app_id)
+
+        app_fields_arr = self.plan.root.projector.project([app_record], strict=True)
+        app_fields = app_fields_arr[0] if app_fields_arr else {}
+
+        memo, ctx = self._context(app_id, mode)
+
+        # 🔁 Sibling subtrees are fetched concurrently ("batched": one call per relation edge, "bulk": one per object)
+        top_key = self.plan.root.output_key
+        started = time.perf_counter()
+        hierarchy_in_flight.inc(entry_point=self.name)
+        try:
+            children = await build_hierarchy(self.plan.root, app_id, ctx)
+        except Exception:
+            observe_build(self.name, ctx.mode, time.perf_counter() - started, ctx.observed, result="error")
+            raise
+        finally:
+            memo.close()
+            hierarchy_in_flight.dec(entry_point=self.name)
+        observe_build(self.name, ctx.mode, time.perf_counter() - started, ctx.observed,
+                      result="partial" if ctx.errors else "ok")
+        app_result = {top_key: {**app_fields, **children}}
+        fanout_stats.record(application_name, ctx.observed)
+        print(f"♻️ [{self.name}] {application_name}: {memo.stats()}")
+        if fetch_stats is not None:
+            fetch_stats.update(memo.stats())
+
+        if ctx.errors:
+            # ⏱️ Partial tree: returned with its gaps listed, never snapshotted
+            return {**app_result, "incomplete": True, "errors": ctx.errors}
+        snapshot_store.put_hierarchy(self.profile_key, application_name, app_result, app_id)
+        return app_result
+
+    async def stream(self, application_name, mode=None):
+        """
+        build() in chunks: the application's own fields right after the lookup,
+        then one chunk per top-level child as its subtree completes.
+        Each chunk is {"path": [...], "data": ..., "hasNext": bool}, plus "errors"
+        for subtrees that gave up since the previous chunk.
+        """
+        start_deadline(HIERARCHY_DEADLINE_SECONDS)
+        app_data = await fetch_application_by_name(application_name)
+        if not app_data:
+            yield {"error": f"Application {application_name} not found.", "hasNext": False}
+            return
+
+        app_record = app_data[0]
+        app_id = app_record.get("fivestarId")
+        current_application.set(app_id)
+
+        app_fields_arr = self.plan.root.projector.project([app_record], strict=True)
+        top_key = self.plan.root.output_key
+        remaining = len(self.plan.root.children)
+        yield {"path": [top_key], "data": app_fields_arr[0] if app_fields_arr else {}, "hasNext": remaining > 0}
+
+        memo, ctx = self._context(app_id, mode)
+        entry_point = f"{self.name}_stream"
+        started = time.perf_counter()
+        hierarchy_in_flight.inc(entry_point=entry_point)
+        try:
+            reported = 0
+            async for child_key, records in stream_hierarchy(self.plan.root, app_id, ctx):
+                remaining -= 1
+                chunk = {"path": [top_key, child_key], "data": records, "hasNext": remaining > 0}
+                if len(ctx.errors) > reported:
+                    chunk.update({"incomplete": True, "errors": ctx.errors[reported:]})
+                    reported = len(ctx.errors)
+                yield chunk
+        finally:
+            memo.close()
+            hierarchy_in_flight.dec(entry_point=entry_point)
+        observe_build(entry_point, ctx.mode, time.perf_counter() - started, ctx.observed,
+                      result="partial" if ctx.errors else "ok")
+        fanout_stats.record(application_name, ctx.observed)
+        print(f"♻️ [{self.name}] {application_name}: {memo.stats()}")
+
+
+# ------------------ 📘 Approval Credit ------------------
+APPROVAL_CREDIT_FORMS = {
+    os.getenv("FORM_APPLICATION"): "Application__c",
+    os.getenv("FORM_PROPERTY"): "Property__c",
+    os.getenv("FORM_LOAN_APPLICANT"): "Loan_Applicant__c",
+    os.getenv("FORM_CAPABILITY"): "Capability__c",
+    os.getenv("FORM_LOAN_DETAILS"): "Loan_Details__c",
+    os.getenv("FORM_CONTENT_VERSION"): "ContentVersion",
+    os.getenv("FORM_CASHFLOW"): "Cashflow__c",
+    os.getenv("FORM_CHARACTER"): "Character__c",
+    os.getenv("FORM_PROPERTY_OWNERS"): "Property_Owners__c",
+    os.getenv("FORM_BUREAU_HIGHMARK"): "Bureau_Highmark__c",
+    os.getenv("FORM_COMMON_OBJECT"): "Commonobject__c",
+    os.getenv("FORM_DEDUPE_DETAIL"): "Dedupe_Detail__c",
+    os.getenv("FORM_DEFERRAL_DOCUMENT"): "Deferral_Document__c",
+    os.getenv("FORM_FEE_CREATION"): "Fee_Creation__c",
+    os.getenv("FORM_LOAN_LIEN_LINKING"): "Loan_Lien_Linking__c",
+    os.getenv("FORM_RECEIPT"): "Receipt__c",
+    os.getenv("FORM_SANCTION_CONDITION"): "Sanction_Condition__c",
+    os.getenv("FORM_TOPUP"): "Topup__c",
+    os.getenv("FORM_TR_DEVIATION"): "Tr_Deviation__c",
+    os.getenv("FORM_FORM_REVISIT") : "Revisit__c",
+    os.getenv("FORM_GEO_LOCATION") : "Form_Geo_Location__c",
+    os.getenv("FORM_VERIFICATION") : "Verification__c"
+}
+
+APPROVAL_CREDIT_RELATION_MAP = {
+    "Application__c": {
+        "Capability__c": {"ContentVersion": {}},
+        "Cashflow__c": {"ContentVersion": {}},
+        "Character__c": {"Property_Owners__c": {}},
+        "CommonObject__c": {},
+        "Deferral_Document__c": {},
+        "Fee_Creation__c": {},
+        "Loan_Applicant__c": {
+            "Bureau_Highmark__c": {"Loan_Details__c": {}},
+            "Capability__c":{},
+            "Cashflow__c":{},
+            "Character__c":{},
+            "ContentVersion":{},
+            "Dedupe_Details__c": {},
+            "Fee_Creation__c": {},
+            "Loan_Details__c": {},
+            "Property__c": {
+                "CommonObject__c": {},
+                "Deferral_Document__c": {},
+                "Fee_Creation__c": {},
+                "Property_Owners__c": {},
+                "Tr_Deviation__c": {}
+            },
+            "Property_Owners__c" : {},
+            "Reciept__c" : {},
+            "Tr_Deviation__c" : {}
+        },
+        "Loan_Lien_Linking__c": {},
+        "Property__c": {},
+        "Reciept__c": {},
+        "Sanction_Condition__c": {},
+        "Topup__c": {},
+        "Tr_Deviation__c": {}
+    }
+}
+
+
+# ------------------ 📘 FIV-C ------------------
+FIVC_FORMS = {
+    os.getenv("FORM_APPLICATION"): "Application__c",
+    os.getenv("FORM_PROPERTY"): "Property__c",
+    os.getenv("FORM_LOAN_APPLICANT"): "Loan_Applicant__c",
+    os.getenv("FORM_CAPABILITY"): "Capability__c",
+    os.getenv("FORM_LOAN_DETAILS"): "Loan_Details__c",
+    os.getenv("FORM_CHARACTER"): "Character__c",
+    os.getenv("FORM_PROPERTY_OWNERS"): "Property_Owners__c",
+    os.getenv("FORM_BUREAU_HIGHMARK"): "Bureau_Highmark__c",
+    os.getenv("FORM_COMMON_OBJECT"): "CommonObject__c",
+    os.getenv("FORM_DEDUPE_DETAIL"): "Dedupe_Detail__c",
+    os.getenv("FORM_DEFERRAL_DOCUMENT"): "Deferral_Document__c",
+    os.getenv("FORM_FORM_REVISIT") : "Revisit__c",
+    os.getenv("FORM_VERIFICATION") : "Verification__c",
+    os.getenv("FORM_GEO_LOCATION") : "Form_Geo_Location__c"
+}
+
+FIVC_RELATION_MAP = {
+    "Application__c": {
+        "Capability__c": {},
+        "Character__c": {
+            "Property_Owners__c": {}
+        },
+        "CommonObject__c": {},
+        "Deferral_Document__c": {
+            "Geo_Location__c": {}
+        },
+        "Geo_Location__c": {},
+        "Loan_Applicant__c": {
+            "Bureau_Highmark__c": {
+                "Loan_Details__c": {}
+            },
+            "Capability__c": {},
+            "Character__c": {},
+            "Deferral_document__c": {},
+            "Geo_Location__c": {},
+            "Loan_Details__c": {},
+            "Property__c": {
+                "CommonObject__c": {},
+                "Deferral_Document__c": {},
+                "Geo_Location__c": {},
+                "Property_Owners__c": {}
+            },
+            "Property_Owners__c": {}
+        },
+        "Property__c": {},
+        "Verification__c": {
+            "Capability__c": {},
+            "Character__c": {},
+            "Revisit__c": {}
+        }
+    }
+}
+
+
+# ------------------ 🗂️ Stage Registry ------------------
+STAGES = {
+    "approval_credit": Stage("approval_credit", APPROVAL_CREDIT_FORMS, APPROVAL_CREDIT_RELATION_MAP, "./filtered_fieldMap.json"),
+    "fivc": Stage("fivc", FIVC_FORMS, FIVC_RELATION_MAP, "./filtered_fieldMap_FIVC.json", type_prefix="Fivc_"),
+}
+
+DEFAULT_STAGE = os.getenv("DEFAULT_STAGE", "approval_credit")
@@ -0,0 +1,196 @@
+import asyncio
+
+import coalescing
+from coalescing import BuildCoalescer
+from tracing import RequestTrace
+from upstream_governor import SharedPriority, UpstreamGovernor, priority, priority_name
+
+
+def counting_build(result="tree", delay=0.02):
+    calls = []
+
+    async def build():
+        calls.append(priority_name())
+        await asyncio.sleep(delay)
+        return {"result": result}
+
+    build.calls = calls
+    return build
+
+
+async def settle(turns=5):
+    """Let waiters, the build task and queued governor calls all reach their await."""
+    for _ in range(turns):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_identical_builds_share_one_result():
+    coalescer = BuildCoalescer(enabled=True)
+    build = counting_build()
+
+    async def run():
+        return await asyncio.gather(*(coalescer.run("k", build) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(build.calls) == 1
+    assert all(r is results[0] for r in results)
+    assert coalescer.stats() == {"enabled": True, "in_flight": 0, "waiters": 0, "builds": 1, "joined": 4}
+
+
+def test_disabled_or_traced_calls_build_on_their_own():
+    build = counting_build()
+
+    async def run(coalescer, traced=False):
+        async def one():
+            if traced:
+                with RequestTrace("APP"):
+                    return await coalescer.run("k", build)
+            return await coalescer.run("k", build)
+        await asyncio.gather(one(), one())
+
+    asyncio.run(run(BuildCoalescer(enabled=False)))
+    asyncio.run(run(BuildCoalescer(enabled=True), traced=True))
+    assert len(build.calls) == 4
+
+
+def test_cancelled_waiter_leaves_the_build_to_the_others():
+    coalescer = BuildCoalescer(enabled=True)
+    build = counting_build()
+
+    async def run():
+        waiters = [asyncio.ensure_future(coalescer.run("k", build)) for _ in range(3)]
+        await asyncio.sleep(0.005)
+        waiters[0].cancel()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    first, *rest = asyncio.run(run())
+    assert isinstance(first, asyncio.CancelledError)
+    assert rest == [{"result": "tree"}] * 2
+    assert len(build.calls) == 1
+
+
+def test_build_is_cancelled_when_every_waiter_leaves():
+    coalescer = BuildCoalescer(enabled=True)
+    finished = []
+
+    async def build():
+        await asyncio.sleep(0.05)
+        finished.append(True)
+
+    async def run():
+        waiters = [asyncio.ensure_future(coalescer.run("k", build)) for _ in range(2)]
+        await asyncio.sleep(0.005)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert finished == []
+    assert coalescer.stats()["in_flight"] == 0
+
+
+def test_cancelled_build_is_never_joined():
+    coalescer = BuildCoalescer(enabled=True)
+
+    async def run():
+        waiter = asyncio.ensure_future(coalescer.run("k", counting_build("old", delay=1)))
+        await asyncio.sleep(0.005)
+        waiter.cancel()
+        await asyncio.sleep(0)  # the waiter handled its cancel: the build's own cancel is still pending
+        assert not coalescer.joining("k")
+        return await coalescer.run("k", counting_build("new", delay=0))
+
+    assert asyncio.run(run()) == {"result": "new"}
+    assert coalescer.builds == 2
+
+
+def test_failure_reaches_every_waiter_and_is_not_kept():
+    coalescer = BuildCoalescer(enabled=True)
+
+    async def failing():
+        await asyncio.sleep(0.005)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        results = await asyncio.gather(*(coalescer.run("k", failing) for _ in range(2)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        return await coalescer.run("k", counting_build(delay=0))
+
+    assert asyncio.run(run()) == {"result": "tree"}
+
+
+def test_raise_priority_moves_queued_calls_of_shared_work():
+    governor = UpstreamGovernor(max_in_flight=1)
+    shared = SharedPriority("prefetch")
+    order = []
+
+    async def call(priority_class, tag):
+        async with governor.slot(priority_class, "app"):
+            order.append(tag)
+
+    async def run():
+        await governor.acquire()
+        tasks = [asyncio.ensure_future(call(shared, "shared")), asyncio.ensure_future(call("batch", "batch"))]
+        await asyncio.sleep(0)
+        assert governor.depth("prefetch") == 1
+        governor.raise_priority(shared, "interactive")
+        assert governor.depth("prefetch") == 0 and governor.depth("interactive") == 1
+        governor.raise_priority(shared, "batch")  # never lowered
+        assert shared.name == "interactive"
+        governor.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["shared", "batch"]
+
+
+def test_build_runs_at_the_most_urgent_waiters_priority(monkeypatch):
+    governor = UpstreamGovernor(max_in_flight=1)
+    monkeypatch.setattr(coalescing, "governor", governor)
+    coalescer = BuildCoalescer(enabled=True)
+    order = []
+
+    async def build():
+        async with governor.slot(application="app"):
+            order.append("shared")
+        return "tree"
+
+    async def other_batch_call():
+        async with governor.slot("batch", "app"):
+            order.append("batch")
+
+    async def run():
+        await governor.acquire()  # keep the gateway busy so calls queue
+        with priority("prefetch"):
+            prefetch = asyncio.ensure_future(coalescer.run("k", build))
+        await settle()
+        batch = asyncio.ensure_future(other_batch_call())
+        await settle()
+        assert governor.depth("prefetch") == 1 and governor.depth("batch") == 1
+        interactive = asyncio.ensure_future(coalescer.run("k", build))  # joins and lifts the build
+        await settle()
+        assert governor.depth("interactive") == 1 and governor.depth("prefetch") == 0
+        governor.release()
+        return await asyncio.gather(prefetch, interactive, batch)
+
+    assert asyncio.run(run())[:2] == ["tree", "tree"]
+    assert order == ["shared", "batch"]
+
+
+def test_shared_priority_is_set_for_the_build_only():
+    coalescer = BuildCoalescer(enabled=True)
+    seen = []
+
+    async def build():
+        seen.append(priority_name())
+        return None
+
+    async def run():
+        with priority("batch"):
+            await coalescer.run("k", build)
+            assert priority_name() == "batch"
+
+    asyncio.run(run())
+    assert seen == ["batch"]
+    assert priority_name(SharedPriority("prefetch")) == "prefetch"
@@ -0,0 +1,110 @@
+import copy
+
+from hierarchy_versions import VersionStore, json_patch, version_of
+
+
+def apply_patch(doc, ops):
+    """Minimal RFC 6902 add/remove/replace, enough to check json_patch round-trips."""
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        if op["path"] == "":
+            doc = copy.deepcopy(op["value"])
+            continue
+        *parents, last = [p.replace("~1", "/").replace("~0", "~") for p in op["path"].split("/")[1:]]
+        target = doc
+        for part in parents:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        if isinstance(target, list):
+            if op["op"] == "add":
+                target.append(op["value"]) if last == "-" else target.insert(int(last), op["value"])
+            elif op["op"] == "remove":
+                del target[int(last)]
+            else:
+                target[int(last)] = op["value"]
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = op["value"]
+    return doc
+
+
+def hierarchy(deferrals, name="APP-0001"):
+    return {"Application__c": {"Name": name, "fivestarId": "a1", "Deferral_Document__c": deferrals}}
+
+
+DEFERRALS = [
+    {"fivestarId": "d1", "Status__c": "Open"},
+    {"fivestarId": "d2", "Status__c": "Open"},
+]
+
+
+def test_identical_documents_need_no_operations():
+    assert json_patch(hierarchy(DEFERRALS), hierarchy(copy.deepcopy(DEFERRALS))) == []
+
+
+def test_field_edit_in_record_list_is_one_small_replace():
+    new = copy.deepcopy(DEFERRALS)
+    new[1]["Status__c"] = "Closed"
+    ops = json_patch(hierarchy(DEFERRALS), hierarchy(new))
+    assert ops == [{"op": "replace", "path": "/Application__c/Deferral_Document__c/1/Status__c", "value": "Closed"}]
+
+
+def test_appended_and_removed_records():
+    grown = DEFERRALS + [{"fivestarId": "d3", "Status__c": "Open"}]
+    ops = json_patch(hierarchy(DEFERRALS), hierarchy(grown))
+    assert ops == [{"op": "add", "path": "/Application__c/Deferral_Document__c/-", "value": grown[2]}]
+
+    ops = json_patch(hierarchy(grown), hierarchy(DEFERRALS[:1]))
+    assert [op["path"] for op in ops] == [
+        "/Application__c/Deferral_Document__c/2",
+        "/Application__c/Deferral_Document__c/1",
+    ]
+    assert apply_patch(hierarchy(grown), ops) == hierarchy(DEFERRALS[:1])
+
+
+def test_reordered_records_replace_the_list():
+    reordered = list(reversed(DEFERRALS))
+    ops = json_patch(hierarchy(DEFERRALS), hierarchy(reordered))
+    assert ops == [{"op": "replace", "path": "/Application__c/Deferral_Document__c", "value": reordered}]
+
+
+def test_keys_are_escaped_and_patches_round_trip():
+    old = {"a/b": 1, "c~d": {"x": [1, 2]}, "gone": True}
+    new = {"a/b": 2, "c~d": {"x": [1, 2, 3]}, "added": None}
+    ops = json_patch(old, new)
+    assert {"op": "replace", "path": "/a~1b", "value": 2} in ops
+    assert {"op": "remove", "path": "/gone"} in ops
+    assert apply_patch(old, ops) == new
+
+
+def test_version_is_stable_across_key_order():
+    assert version_of({"a": 1, "b": [1, 2]}) == version_of({"b": [1, 2], "a": 1})
+    assert version_of({"a": 1}) != version_of({"a": 2})
+
+
+def test_delta_responses():
+    store = VersionStore()
+    v1 = store.delta("k", hierarchy(DEFERRALS))["version"]
+    assert store.delta("k", hierarchy(DEFERRALS), since=v1) == {"version": v1, "notModified": True}
+
+    new = copy.deepcopy(DEFERRALS)
+    new[0]["Status__c"] = "Closed"
+    delta = store.delta("k", hierarchy(new), since=v1)
+    assert delta["since"] == v1 and delta["version"] == version_of(hierarchy(new))
+    assert apply_patch(hierarchy(DEFERRALS), delta["patch"]) == hierarchy(new)
+
+    unknown = store.delta("k", hierarchy(new), since="not-a-version")
+    assert unknown == {"version": delta["version"], "data": hierarchy(new)}
+
+
+def test_history_and_application_limits():
+    store = VersionStore(max_applications=2, history=2)
+    versions = [store.record("k", hierarchy(DEFERRALS, name=f"v{i}")) for i in range(3)]
+    assert store.get("k", versions[0]) is None  # pushed out of the per-key history
+    assert store.get("k", versions[2]) is not None
+    assert "data" in store.delta("k", hierarchy(DEFERRALS, name="v3"), since=versions[0])
+
+    store.record("other", {"x": 1})
+    store.record("third", {"x": 2})  # least recently used key ("k") is dropped
+    assert store.get("k", versions[2]) is None
+    assert store.get("other", version_of({"x": 1})) == {"x": 1}
@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from request_memo import RequestMemo
+
+APP = "APP-ID"
+CHARACTERS = [
+    {"fivestarId": "c1", "Application__c": APP, "Loan_Applicant__c": "la1"},
+    {"fivestarId": "c2", "Application__c": APP, "Loan_Applicant__c": "la1"},
+    {"fivestarId": "c3", "Application__c": APP, "Loan_Applicant__c": "la2"},
+]
+
+
+class FakeGateway:
+    """fetch_one / fetch_many over a fixed record set, counting calls."""
+
+    def __init__(self, records, delay=0.0, fail=False):
+        self.records = records
+        self.delay = delay
+        self.fail = fail
+        self.one_calls = []
+        self.many_calls = []
+
+    async def fetch_one(self, form_id, join_field, parent_id, object_name=None):
+        self.one_calls.append((form_id, join_field, parent_id))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("gateway down")
+        return [rec for rec in self.records if rec.get(join_field) == parent_id]
+
+    async def fetch_many(self, form_id, join_field, parent_ids, object_name=None):
+        self.many_calls.append((form_id, join_field, tuple(parent_ids)))
+        await asyncio.sleep(self.delay)
+        return [rec for rec in self.records if rec.get(join_field) in parent_ids]
+
+
+def memo_for(gateway, derive=True):
+    return RequestMemo(gateway.fetch_one, gateway.fetch_many, "Application__c", APP, derive=derive)
+
+
+def test_identical_concurrent_lookups_share_one_fetch():
+    gateway = FakeGateway(CHARACTERS, delay=0.01)
+    memo = memo_for(gateway)
+
+    async def run():
+        return await asyncio.gather(*(memo.fetch_children("CHAR", "Loan_Applicant__c", "la1") for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert len(gateway.one_calls) == 1
+    assert all(r == CHARACTERS[:2] for r in results)
+    assert memo.stats()["fetches"] == 1
+    assert memo.stats()["coalesced"] == 2
+
+
+def test_child_lookups_are_derived_from_application_superset():
+    gateway = FakeGateway(CHARACTERS)
+    memo = memo_for(gateway)
+
+    async def run():
+        everything = await memo.fetch_children("CHAR", "Application__c", APP)
+        by_applicant = await memo.fetch_children_batch("CHAR", "Loan_Applicant__c", ["la1", "la2", "la3"])
+        return everything, by_applicant
+
+    everything, by_applicant = asyncio.run(run())
+    assert everything == CHARACTERS
+    assert by_applicant == CHARACTERS  # la3 has none
+    assert gateway.one_calls == [("CHAR", "Application__c", APP)]
+    assert gateway.many_calls == []
+    stats = memo.stats()
+    assert stats["fetches"] == 1
+    assert stats["derived"] == 3
+    assert stats["records"] == 3
+
+
+def test_derived_records_are_the_same_objects():
+    gateway = FakeGateway(CHARACTERS)
+    memo = memo_for(gateway)
+
+    async def run():
+        await memo.fetch_children("CHAR", "Application__c", APP)
+        return await memo.fetch_children("CHAR", "Loan_Applicant__c", "la2")
+
+    (record,) = asyncio.run(run())
+    assert record is CHARACTERS[2]
+
+
+@pytest.mark.parametrize("records", [
+    [],  # empty superset proves nothing about the children
+    [{"fivestarId": "c1", "Application__c": APP}],  # records do not carry the join field
+])
+def test_no_derivation_when_superset_cannot_answer(records):
+    gateway = FakeGateway(records)
+    memo = memo_for(gateway)
+
+    async def run():
+        await memo.fetch_children("CHAR", "Application__c", APP)
+        await memo.fetch_children("CHAR", "Loan_Applicant__c", "la1")
+
+    asyncio.run(run())
+    assert len(gateway.one_calls) == 2
+    assert memo.stats()["derived"] == 0
+
+
+def test_derivation_can_be_turned_off():
+    gateway = FakeGateway(CHARACTERS)
+    memo = memo_for(gateway, derive=False)
+
+    async def run():
+        await memo.fetch_children("CHAR", "Application__c", APP)
+        return await memo.fetch_children("CHAR", "Loan_Applicant__c", "la1")
+
+    assert asyncio.run(run()) == CHARACTERS[:2]
+    assert len(gateway.one_calls) == 2
+
+
+def test_failed_fetch_is_not_memoized():
+    gateway = FakeGateway(CHARACTERS, fail=True)
+    memo = memo_for(gateway)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await memo.fetch_children("CHAR", "Loan_Applicant__c", "la1")
+        await asyncio.sleep(0)  # let the done-callback forget the failed lookup
+        gateway.fail = False
+        return await memo.fetch_children("CHAR", "Loan_Applicant__c", "la1")
+
+    assert asyncio.run(run()) == CHARACTERS[:2]
+    assert len(gateway.one_calls) == 2
+
+
+def test_close_cancels_loads_nobody_waits_for_any_more():
+    gateway = FakeGateway(CHARACTERS, delay=10)
+    memo = memo_for(gateway)
+
+    async def run():
+        lookup = asyncio.ensure_future(memo.fetch_children("CHAR", "Loan_Applicant__c", "la1"))
+        await asyncio.sleep(0.01)
+        lookup.cancel()  # the caller goes away; the shielded load keeps running...
+        await asyncio.gather(lookup, return_exceptions=True)
+        (load,) = memo._loads
+        assert not load.done()
+        memo.close()  # ...until the build that owns the memo ends
+        await asyncio.sleep(0)
+        assert load.cancelled()
+        assert not memo._loads
+
+    asyncio.run(run())
+    assert len(gateway.one_calls) == 1
@@ -0,0 +1,209 @@
+import asyncio
+import itertools
+import time
+
+import httpx
+import pytest
+
+import resilience
+from resilience import (
+    CircuitBreaker, CircuitOpen, DeadlineExceeded, UpstreamUnavailable, breaker_for, call_upstream, deadline_scope,
+)
+
+_keys = itertools.count()
+
+
+@pytest.fixture
+def key(monkeypatch):
+    """A fresh breaker key per test, with instant retries."""
+    monkeypatch.setattr(resilience, "GATEWAY_RETRY_BACKOFF_MS", 0)
+    monkeypatch.setattr(resilience, "GATEWAY_RETRIES", 2)
+    monkeypatch.setattr(resilience, "GATEWAY_HEDGE_AFTER_MS", 0)
+    return f"form-{next(_keys)}"
+
+
+def responses(*items):
+    """attempt() answering with each item in turn (an exception is raised)."""
+    items = list(items)
+    calls = []
+
+    async def attempt(timeout):
+        item = items[min(len(calls), len(items) - 1)]
+        calls.append(timeout)
+        if isinstance(item, BaseException):
+            raise item
+        return httpx.Response(item)
+
+    attempt.calls = calls
+    return attempt
+
+
+# ------------------ 🔌 Circuit Breaker ------------------
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=2, reset_seconds=60)
+    breaker.failure()
+    assert breaker.state == "closed"
+    breaker.success()
+    breaker.failure()
+    assert breaker.state == "closed"  # success reset the count
+    breaker.failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failures=1, reset_seconds=0.01)
+    breaker.failure()
+    time.sleep(0.02)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # the trial is in flight
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker(failures=5, reset_seconds=0.01)
+    for _ in range(5):
+        breaker.failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open"
+
+
+# ------------------ 🔁 Call Policy ------------------
+def test_retries_retryable_statuses_then_succeeds(key):
+    attempt = responses(503, 502, 200)
+    res = asyncio.run(call_upstream(key, attempt))
+    assert res.status_code == 200
+    assert len(attempt.calls) == 3
+    assert breaker_for(key).state == "closed"
+
+
+def test_gives_up_after_retries_and_counts_a_failure(key):
+    attempt = responses(httpx.ConnectError("refused"))
+    with pytest.raises(UpstreamUnavailable) as info:
+        asyncio.run(call_upstream(key, attempt))
+    assert len(attempt.calls) == 3
+    assert info.value.reason == "unavailable"
+    assert breaker_for(key).consecutive == 1
+
+
+def test_open_circuit_fails_fast(key):
+    breaker = breaker_for(key)
+    breaker.failures = 1
+    breaker.failure()
+    attempt = responses(200)
+    with pytest.raises(CircuitOpen):
+        asyncio.run(call_upstream(key, attempt))
+    assert attempt.calls == []
+
+
+def test_non_transport_error_on_trial_does_not_wedge_the_circuit(key):
+    breaker = breaker_for(key)
+    breaker.failures, breaker.reset_seconds = 1, 0.01
+    breaker.failure()
+    time.sleep(0.02)
+    with pytest.raises(httpx.InvalidURL):
+        asyncio.run(call_upstream(key, responses(httpx.InvalidURL("bad url"))))
+    assert not breaker.trial
+    time.sleep(0.02)
+    assert asyncio.run(call_upstream(key, responses(200))).status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_cancelled_trial_is_released(key):
+    breaker = breaker_for(key)
+    breaker.failures, breaker.reset_seconds = 1, 0.01
+    breaker.failure()
+    time.sleep(0.02)
+
+    async def hang(timeout):
+        await asyncio.sleep(10)
+
+    async def run():
+        task = asyncio.ensure_future(call_upstream(key, hang))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert not breaker.trial
+    assert breaker.allow()  # a new trial may go through
+
+
+def test_attempt_waiting_for_its_hedge_is_cancelled_with_the_call(monkeypatch, key):
+    monkeypatch.setattr(resilience, "GATEWAY_HEDGE_AFTER_MS", 1000)
+    attempts = []
+
+    async def hang(timeout):
+        attempts.append(asyncio.current_task())
+        await asyncio.sleep(10)
+
+    async def run():
+        task = asyncio.ensure_future(call_upstream(key, hang, timeout=5))
+        await asyncio.sleep(0.01)  # still before the hedge
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        # checked before asyncio.run() cancels whatever is left over
+        assert len(attempts) == 1
+        assert attempts[0].cancelled()
+
+    asyncio.run(run())
+
+
+def test_deadline_bounds_the_call(key):
+    async def hang(timeout):
+        await asyncio.sleep(10)
+
+    async def run():
+        with deadline_scope(0.05):
+            await call_upstream(key, hang)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert time.monotonic() - started < 1
+    assert breaker_for(key).consecutive == 1  # a hung form counts towards its circuit
+
+
+def test_spent_deadline_makes_no_call(key):
+    attempt = responses(200)
+
+    async def run():
+        with deadline_scope(0.001):
+            await asyncio.sleep(0.01)
+            await call_upstream(key, attempt)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert attempt.calls == []
+    assert breaker_for(key).consecutive == 0
+
+
+# ------------------ 🌐 Unusable Answers ------------------
+class _Session:
+    async def get(self):
+        return "session"
+
+
+@pytest.mark.parametrize("response, reason", [
+    (httpx.Response(500, json={"error": "boom"}), "500"),
+    (httpx.Response(404, json=[]), "404"),
+    (httpx.Response(200, content=b"<html>"), "invalid_json"),
+])
+def test_unusable_gateway_answers_raise(monkeypatch, key, response, reason):
+    import gateway_client
+
+    async def get(url, session_id, object_name=None, call=None, timeout=None):
+        return response
+
+    monkeypatch.setattr(gateway_client, "gateway_session", _Session())
+    monkeypatch.setattr(gateway_client, "_get_with_session", get)
+    with pytest.raises(UpstreamUnavailable) as info:
+        asyncio.run(gateway_client.fetch_json_checked(f"https://gw/incomming/configdata/org/{key}", "Character__c"))
+    assert info.value.reason == reason
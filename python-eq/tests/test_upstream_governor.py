@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+
+from upstream_governor import UpstreamGovernor, priority, priority_name
+
+
+async def queue_calls(governor, calls, order):
+    """Hold the only slot, queue `calls` ((priority, application, tag)), release, and record grant order."""
+    await governor.acquire()
+
+    async def call(priority_class, application, tag):
+        async with governor.slot(priority_class, application):
+            order.append(tag)
+            await asyncio.sleep(0)
+
+    tasks = []
+    for priority_class, application, tag in calls:
+        tasks.append(asyncio.ensure_future(call(priority_class, application, tag)))
+        await asyncio.sleep(0)  # enqueue in this order
+    governor.release()
+    await asyncio.gather(*tasks)
+
+
+def test_classes_are_served_strictly_by_priority():
+    governor = UpstreamGovernor(max_in_flight=1)
+    order = []
+    asyncio.run(queue_calls(governor, [
+        ("prefetch", "a", "P"), ("batch", "a", "B"), ("interactive", "a", "I"),
+    ], order))
+    assert order == ["I", "B", "P"]
+    assert governor.in_flight == 0
+
+
+def test_applications_take_turns_within_a_class():
+    governor = UpstreamGovernor(max_in_flight=1)
+    order = []
+    asyncio.run(queue_calls(governor, [
+        ("batch", "A", "A0"), ("batch", "A", "A1"), ("batch", "A", "A2"), ("batch", "B", "B0"), ("batch", "B", "B1"),
+    ], order))
+    assert order == ["A0", "B0", "A1", "B1", "A2"]
+
+
+def test_in_flight_cap_is_respected():
+    governor = UpstreamGovernor(max_in_flight=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with governor.slot():
+            peak = max(peak, governor.in_flight)
+            await asyncio.sleep(0.005)
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(10)))
+
+    asyncio.run(run())
+    assert peak == 2
+    assert governor.in_flight == 0
+
+
+def test_rate_limit_spaces_calls():
+    governor = UpstreamGovernor(max_in_flight=10, rate=100, burst=1)
+
+    async def call():
+        async with governor.slot():
+            pass
+
+    async def run():
+        started = time.monotonic()
+        await asyncio.gather(*(call() for _ in range(6)))
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.04  # 1 from the bucket, 5 more at 100/s
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    governor = UpstreamGovernor(max_in_flight=1)
+
+    async def run():
+        await governor.acquire()
+        waiter = asyncio.ensure_future(governor.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        governor.release()
+        await asyncio.wait_for(governor.acquire(), 1)
+        governor.release()
+
+    asyncio.run(run())
+    assert governor.in_flight == 0
+    assert governor.depth() == 0
+
+
+def test_priority_context_and_names():
+    with priority("batch"):
+        assert priority_name() == "batch"
+        with priority("bogus"):
+            assert priority_name() == "interactive"
+    assert priority_name() == "interactive"
+
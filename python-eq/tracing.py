@@ -0,0 +1,196 @@
+import io
+import time
+import uuid
+import pstats
+import cProfile
+from contextvars import ContextVar
+
+# Trace of the hierarchy build running in this task (None → tracing off), and
+# the plan path the current fetch belongs to (set by hierarchy_engine).
+current_trace = ContextVar("current_trace", default=None)
+trace_node = ContextVar("trace_node", default=None)
+
+PROFILE_TOP_FUNCTIONS = 25
+
+# The RequestTrace currently profiling: one cProfile per process at a time
+# (Python 3.12+ raises ValueError when a second one is enabled)
+_profiling = None
+
+
+# ------------------ 🔬 Opt-in ------------------
+def trace_options(request=None, trace=None):
+    """
+    (enabled, profile) from a `trace` argument and/or the X-Trace request header.
+    "1"/"true" turns tracing on; "profile" also samples Python time with cProfile.
+    """
+    value = trace
+    if value in (None, False, "") and request is not None:
+        value = request.headers.get("x-trace")
+    if value in (None, False, ""):
+        return False, False
+    value = str(value).lower()
+    if value in ("0", "false", "no", "off"):
+        return False, False
+    return True, value == "profile"
+
+
+# ------------------ 🧾 Request Trace ------------------
+class RequestTrace:
+    """
+    Every upstream call (and memo/cache hit) made while one hierarchy is built,
+    with offsets relative to the start of the build. Use as a context manager
+    around the build; report(plan) arranges the calls as a tree mirroring the
+    plan. With `profile=True`, cProfile runs for the duration of the build.
+    The profiler sees the whole event loop thread, so concurrent requests add
+    noise; use it on a quiet instance. Only one build is profiled at a time:
+    an overlapping profile request is traced without it ("profile": null and
+    the reason under "profile_skipped").
+    """
+
+    def __init__(self, application_name, profile=False):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.application_name = application_name
+        self.calls = []
+        self.profile = profile
+        self._profiler = None
+        self.profile_skipped = None
+        self._token = None
+        self.started = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    def __enter__(self):
+        self._token = current_trace.set(self)
+        self.started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        if self.profile:
+            self._start_profiler()
+        return self
+
+    def __exit__(self, *exc):
+        global _profiling
+        if self._profiler is not None:
+            self._profiler.disable()
+            if _profiling is self:
+                _profiling = None
+        self.wall_seconds = time.perf_counter() - self.started
+        self.cpu_seconds = time.process_time() - self._cpu_started
+        current_trace.reset(self._token)
+        return False
+
+    def _start_profiler(self):
+        global _profiling
+        if _profiling is not None:
+            self.profile_skipped = f"another request is being profiled (trace {_profiling.trace_id})"
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:  # a profiler outside this module is active
+            self.profile_skipped = str(e)
+            return
+        self._profiler = profiler
+        _profiling = self
+
+    def offset_ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 3)
+
+    def summary(self):
+        upstream = [call for call in self.calls if call["cache"] == "miss"]
+        return {
+            "trace_id": self.trace_id,
+            "wall_ms": round(self.wall_seconds * 1000, 3),
+            "cpu_ms": round(self.cpu_seconds * 1000, 3),
+            "upstream_calls": len(upstream),
+            "upstream_ms": round(sum(call["duration_ms"] or 0 for call in upstream), 3),
+            "cache_hits": sum(1 for call in self.calls if call["cache"] == "hit"),
+            "snapshot_hits": sum(1 for call in self.calls if call["cache"] == "snapshot"),
+            "memo_hits": sum(1 for call in self.calls if call["cache"] in ("memo", "derived")),
+        }
+
+    def header(self):
+        """Compact summary for the X-Trace response header."""
+        return ";".join(f"{key}={value}" for key, value in self.summary().items())
+
+    def report(self, plan=None):
+        by_node = {}
+        for call in self.calls:
+            by_node.setdefault(call["node"], []).append(call)
+
+        def describe(node):
+            return {
+                "object": node.object_name,
+                "path": node.path,
+                "calls": by_node.pop(node.path, []),
+                "children": [describe(child) for child in node.children],
+            }
+
+        tree = describe(plan.root) if plan is not None else None
+        other = [call for calls in by_node.values() for call in calls]
+        if tree is not None:
+            tree["calls"] = other + tree["calls"]  # application lookup, bulk prefetch
+            other = []
+        return {
+            **self.summary(),
+            "application_name": self.application_name,
+            "tree": tree,
+            "calls": other,
+            "profile": self._profile_report(),
+            **({"profile_skipped": self.profile_skipped} if self.profile_skipped else {}),
+        }
+
+    def _profile_report(self):
+        if self._profiler is None:
+            return None
+        stats = pstats.Stats(self._profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, function), (_, calls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({
+                "function": f"{function} ({filename.rsplit('/', 1)[-1]}:{line})",
+                "calls": calls,
+                "tottime_ms": round(tottime * 1000, 3),
+                "cumtime_ms": round(cumtime * 1000, 3),
+            })
+        rows.sort(key=lambda row: row["tottime_ms"], reverse=True)
+        return {"top_functions": rows[:PROFILE_TOP_FUNCTIONS]}
+
+
+# ------------------ 📝 Recording ------------------
+def start_call(form_id, object_name, join_field, parent_ids):
+    """Open a trace entry for a lookup; returns None when tracing is off."""
+    trace = current_trace.get()
+    if trace is None:
+        return None
+    call = {
+        "node": trace_node.get() or "",
+        "object": object_name,
+        "form_id": form_id,
+        "join_field": join_field,
+        "parent_ids": list(parent_ids),
+        "start_ms": trace.offset_ms(),
+        "duration_ms": None,
+        "bytes": 0,
+        "status": None,
+        "records": None,
+        "cache": "miss",
+    }
+    trace.calls.append(call)
+    return call
+
+
+def finish_call(call, records, cache="miss"):
+    if call is None:
+        return
+    trace = current_trace.get()
+    if trace is not None:
+        call["duration_ms"] = round(trace.offset_ms() - call["start_ms"], 3)
+    call["records"] = len(records) if isinstance(records, list) else None
+    call["cache"] = cache
+
+
+def record_lookup(form_id, join_field, parent_ids, cache):
+    """Lookups answered without a gateway call (memo: shared fetch, derived: filtered superset)."""
+    call = start_call(form_id, None, join_field, parent_ids)
+    if call is not None:
+        call["duration_ms"] = 0.0
+        call["cache"] = cache
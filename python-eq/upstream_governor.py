@@ -0,0 +1,230 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+from response_cache import current_application
+from metrics import governor_wait, register_collector
+
+load_dotenv()
+
+
+# ------------------ 🔧 ENV VARS ------------------
+GATEWAY_MAX_CONCURRENCY = int(os.getenv("GATEWAY_MAX_CONCURRENCY", "16"))  # upstream calls in flight
+GATEWAY_RATE_LIMIT = float(os.getenv("GATEWAY_RATE_LIMIT", "0"))  # calls per second; 0 → unlimited
+GATEWAY_RATE_BURST = int(os.getenv("GATEWAY_RATE_BURST", "20"))  # token bucket size
+
+# Served strictly in this order; within a class, applications take turns
+PRIORITIES = ("interactive", "batch", "prefetch")
+
+# Priority class of the upstream calls made by the current task (GraphQL / REST requests are interactive);
+# a SharedPriority inside work done for several callers at once
+current_priority = ContextVar("current_priority", default="interactive")
+
+
+class SharedPriority:
+    """
+    Priority of work shared by several callers (a coalesced build): starts at
+    the first caller's class and is raised with governor.raise_priority when
+    a more urgent caller joins, so nobody waits behind a lower class.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+
+def priority_name(value=None):
+    """Class name of `value` (default: the current task's priority)."""
+    value = current_priority.get() if value is None else value
+    name = value.name if isinstance(value, SharedPriority) else value
+    return name if name in PRIORITIES else PRIORITIES[0]
+
+
+@contextmanager
+def priority(name):
+    """Run the block's upstream calls (and tasks started in it) at priority class `name`."""
+    token = current_priority.set(name if name in PRIORITIES else PRIORITIES[0])
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+# ------------------ 🚦 Governor ------------------
+class UpstreamGovernor:
+    """
+    Process-wide admission control in front of the gateway:
+    - at most `max_in_flight` calls at once
+    - a token bucket of `rate` calls per second (bursts up to `burst`)
+    - waiting calls are served by priority class (interactive, batch, prefetch)
+      and, within a class, round-robin between applications, so one large
+      batch application cannot starve the others
+
+    Use `async with governor.slot(): ...` around each upstream call.
+    """
+
+    def __init__(self, max_in_flight=GATEWAY_MAX_CONCURRENCY, rate=GATEWAY_RATE_LIMIT, burst=GATEWAY_RATE_BURST):
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.in_flight = 0
+        self.tokens = float(self.burst)
+        self.refilled_at = time.monotonic()
+        self.queues = {name: OrderedDict() for name in PRIORITIES}  # class → application → deque of waiters
+        self._timer = None
+        self.granted = {name: 0 for name in PRIORITIES}
+        self.wait_seconds_total = {name: 0.0 for name in PRIORITIES}
+        self.wait_seconds_max = {name: 0.0 for name in PRIORITIES}
+
+    @asynccontextmanager
+    async def slot(self, priority_class=None, application=None):
+        await self.acquire(priority_class, application)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority_class=None, application=None):
+        value = priority_class or current_priority.get()
+        shared = value if isinstance(value, SharedPriority) else None
+        name = priority_name(value)
+        if not self.depth() and self.in_flight < self.max_in_flight and self._token_wait() == 0:
+            self._grant(name, 0.0)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        app = application if application is not None else current_application.get()
+        self.queues[name].setdefault(app, deque()).append((waiter, time.monotonic(), name, shared))
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # granted just as the caller gave up
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def raise_priority(self, shared, name):
+        """Lift `shared` (and its calls already queued) to class `name` if that is more urgent."""
+        name = priority_name(name)
+        if PRIORITIES.index(name) >= PRIORITIES.index(priority_name(shared)):
+            return
+        shared.name = name
+        for queues in self.queues.values():
+            for app, waiters in list(queues.items()):
+                moved = [entry for entry in waiters if entry[3] is shared]
+                if not moved:
+                    continue
+                queues[app] = deque(entry for entry in waiters if entry[3] is not shared)
+                if not queues[app]:
+                    del queues[app]
+                target = self.queues[name].setdefault(app, deque())
+                target.extend((future, enqueued_at, name, shared) for future, enqueued_at, _, shared in moved)
+        self._dispatch()
+
+    def depth(self, name=None):
+        names = [name] if name else PRIORITIES
+        return sum(len(q) for n in names for q in self.queues[n].values())
+
+    # 🔧 Internals
+    def _grant(self, name, waited):
+        self.in_flight += 1
+        if self.rate > 0:
+            self.tokens -= 1
+        self.granted[name] += 1
+        self.wait_seconds_total[name] += waited
+        self.wait_seconds_max[name] = max(self.wait_seconds_max[name], waited)
+        governor_wait.observe(waited, priority=name)
+
+    def _token_wait(self):
+        """Seconds until a token is available (0 → one is available now)."""
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def _dispatch(self):
+        while self.in_flight < self.max_in_flight:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            wait = self._token_wait()
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._on_timer)
+                return
+            future, enqueued_at, name, _ = self._pop_waiter()
+            self._grant(name, time.monotonic() - enqueued_at)
+            future.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _next_waiter(self):
+        """Head of the queue that would be served next, dropping waiters that gave up."""
+        for name in PRIORITIES:
+            queues = self.queues[name]
+            while queues:
+                app, waiters = next(iter(queues.items()))
+                while waiters and waiters[0][0].done():
+                    waiters.popleft()
+                if waiters:
+                    return waiters[0]
+                del queues[app]
+        return None
+
+    def _pop_waiter(self):
+        for name in PRIORITIES:
+            queues = self.queues[name]
+            if queues:
+                app, waiters = next(iter(queues.items()))
+                entry = waiters.popleft()
+                # 🔄 Round-robin: this application goes to the back of its class
+                del queues[app]
+                if waiters:
+                    queues[app] = waiters
+                return entry
+        return None
+
+    def stats(self):
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "rate_limit_per_second": self.rate or None,
+            "tokens": round(self.tokens, 2) if self.rate > 0 else None,
+            "classes": {
+                name: {
+                    "queued": self.depth(name),
+                    "applications_waiting": len(self.queues[name]),
+                    "granted": self.granted[name],
+                    "avg_wait_ms": round(self.wait_seconds_total[name] / self.granted[name] * 1000, 3)
+                    if self.granted[name] else None,
+                    "max_wait_ms": round(self.wait_seconds_max[name] * 1000, 3),
+                }
+                for name in PRIORITIES
+            },
+        }
+
+
+# One governor per process, shared by every server and background job
+governor = UpstreamGovernor()
+
+
+@register_collector
+def _governor_metrics():
+    return {
+        "gateway_governor_queue_depth": (
+            "Upstream calls waiting for admission", "gauge",
+            [({"priority": name}, governor.depth(name)) for name in PRIORITIES],
+        ),
+        "gateway_governor_in_flight": ("Upstream calls admitted and running", "gauge", [({}, governor.in_flight)]),
+    }